@@ -0,0 +1,58 @@
+"""Import time regression benchmark for the defi package
+
+Runs `import defi` in fresh interpreters and checks that plotting libraries are not
+loaded, and that the median import time stays under a limit. Exits with status 1 on
+regression, so it can run as a CI step:
+
+    python benchmarks/bench_import.py --max-ms 1500
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ['matplotlib', 'scipy']
+
+PROBE = f"""
+import json, sys, time
+t = time.perf_counter()
+import defi
+import defi.defi_tools as dft
+dft.iloss(1.5); dft.compare_array([10, 20], var_A=5)
+elapsed = time.perf_counter() - t
+print(json.dumps({{'ms': elapsed * 1000, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure(runs=7):
+    """Median import time in milliseconds and heavy modules loaded by the import"""
+    times, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE], check=True, capture_output=True, text=True).stdout
+        res = json.loads(out.strip().splitlines()[-1])
+        times.append(res['ms'])
+        loaded.update(res['loaded'])
+    return statistics.median(times), sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--max-ms', type=float, default=1500, help='max median import time in milliseconds')
+    args = parser.parse_args()
+
+    ms, loaded = measure(args.runs)
+    print(json.dumps({'import_ms': round(ms, 1), 'heavy_modules_loaded': loaded, 'max_ms': args.max_ms}))
+
+    if loaded:
+        print(f'FAIL: importing defi loaded {", ".join(loaded)}')
+        sys.exit(1)
+    if ms > args.max_ms:
+        print(f'FAIL: import took {ms:.0f}ms, limit {args.max_ms:.0f}ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Deterministic JSON fixtures for the benchmarks, with the same shape as each API response
+
+Files are named with defi.transport.fixtureName(), so they are served by ReplayTransport.
+Real responses can be recorded into the same directory instead with:
+
+    setTransport(ReplayTransport('benchmarks/fixtures', fallback=HttpTransport()))
+"""
+import json
+import os
+
+import numpy as np
+
+from defi.transport import fixtureName
+
+
+HISTORY_YEARS = {'coin-1y': 1, 'coin-5y': 5, 'coin-10y': 10, 'stable-1y': 1, 'stable-5y': 5, 'stable-10y': 10}
+MARKET_COINS = ['ethereum']
+N_PROTOCOLS = 3000
+N_TOKENS = 5000
+N_PAIRS = 1000
+N_TICKERS = 100
+
+
+def _history(rng, years, vol):
+    n = 365 * years
+    end = 1_700_000_000_000
+    dates = end - 86_400_000 * np.arange(n)[::-1]
+    prices = np.exp(np.cumsum(rng.normal(0, vol, n)))
+    return {key: [[int(d), float(p * mult)] for d, p in zip(dates, prices)]
+            for key, mult in (('prices', 1), ('market_caps', 1e9), ('total_volumes', 1e7))}
+
+
+def _protocols(rng):
+    categories = ['Dexes', 'Lending', 'Yield', 'Derivatives', 'CDP', 'Bridge']
+    chains = ['Ethereum', 'BSC', 'Polygon', 'Avalanche', 'Fantom', 'Multi-Chain']
+    res = []
+    for i in range(N_PROTOCOLS):
+        chain_tvls = {c: float(rng.random() * 1e8) for c in rng.choice(chains, 3, replace=False)}
+        res.append({'id': str(i), 'name': f'Protocol {i}', 'address': f'0x{i:040x}', 'symbol': f'P{i % 500}',
+                    'url': f'https://protocol{i}.fi', 'description': 'A DeFi protocol ' * 8,
+                    'chain': chains[i % len(chains)], 'logo': None, 'audits': str(i % 3), 'gecko_id': f'protocol-{i}',
+                    'category': categories[i % len(categories)], 'chains': list(chain_tvls),
+                    'chainTvls': chain_tvls, 'tvl': float(rng.random() * 1e9), 'change_1d': float(rng.normal()),
+                    'change_7d': float(rng.normal()), 'mcap': None if i % 4 else float(rng.random() * 1e9)})
+    return res
+
+
+def _protocol(rng, days=1500):
+    start = 1_546_300_800
+    tvl = [{'date': start + 86_400 * i, 'totalLiquidityUSD': float(v)}
+           for i, v in enumerate(np.abs(np.cumsum(rng.normal(0, 1e7, days))) + 1e9)]
+    return {'id': '1', 'name': 'Uniswap', 'symbol': 'UNI', 'category': 'Dexes', 'chains': ['Ethereum'],
+            'tvl': tvl, 'chainTvls': {'Ethereum': {'tvl': tvl}}}
+
+
+def _chart(rng, days=1500):
+    start = 1_546_300_800
+    return [{'date': str(start + 86_400 * i), 'totalLiquidityUSD': float(v)}
+            for i, v in enumerate(np.abs(np.cumsum(rng.normal(0, 1e8, days))) + 1e10)]
+
+
+def _tokens(rng):
+    return {'updated_at': 1_618_645_355_351,
+            'data': {f'0x{i:040x}': {'name': f'Token {i}', 'symbol': 'WBNB' if i == 1 else f'TK{i}',
+                                     'price': repr(float(rng.random() * 100)),
+                                     'price_BNB': repr(float(rng.random()))} for i in range(N_TOKENS)}}
+
+
+def _pairs(rng):
+    data = {}
+    for i in range(N_PAIRS):
+        base, quote = i + 2, 1 if i % 3 else (i + 7) % N_TOKENS
+        data[f'0x{base:040x}_0x{quote:040x}'] = {
+            'pair_address': f'0x{N_TOKENS + i:040x}', 'base_name': f'Token {base}', 'base_symbol': f'TK{base}',
+            'base_address': f'0x{base:040x}', 'quote_name': f'Token {quote}',
+            'quote_symbol': 'WBNB' if quote == 1 else f'TK{quote}', 'quote_address': f'0x{quote:040x}',
+            'price': repr(float(rng.random())), 'base_volume': repr(float(rng.random() * 1e6)),
+            'quote_volume': repr(float(rng.random() * 1e5)), 'liquidity': repr(float(rng.random() * 1e8)),
+            'liquidity_BNB': repr(float(rng.random() * 1e5))}
+    return {'updated_at': 1_618_645_355_351, 'data': data}
+
+
+def _summary(pairs):
+    keys = ['price', 'base_volume', 'quote_volume', 'liquidity', 'liquidity_BNB']
+    return {'updated_at': pairs['updated_at'],
+            'data': {k: {f: v[f] for f in keys} for k, v in pairs['data'].items()}}
+
+
+def _tickers(rng):
+    return {'name': 'Ethereum', 'tickers': [
+        {'base': 'ETH', 'target': 'USDT', 'market': {'name': f'Exchange {i}', 'identifier': f'ex{i}',
+                                                     'has_trading_incentive': False},
+         'last': float(2000 + rng.normal()), 'volume': float(rng.random() * 1e5),
+         'converted_last': {'btc': 0.05, 'eth': 1.0, 'usd': float(2000 + rng.normal())},
+         'converted_volume': {'btc': 10.0, 'eth': 200.0, 'usd': float(rng.random() * 1e8)},
+         'trust_score': 'green', 'bid_ask_spread_percentage': float(rng.random()),
+         'timestamp': '2021-04-17T04:00:00+00:00'} for i in range(N_TICKERS)]}
+
+
+def writeFixtures(path, seed=314):
+    """Write all benchmark fixtures into path, returns the number of files written"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(path, exist_ok=True)
+    pairs = _pairs(rng)
+    fixtures = {
+        fixtureName('https://api.llama.fi/protocols'): _protocols(rng),
+        fixtureName('https://api.llama.fi/protocol/uniswap'): _protocol(rng),
+        fixtureName('https://api.llama.fi/charts'): _chart(rng),
+        fixtureName('https://api.pancakeswap.info/api/v2/tokens'): _tokens(rng),
+        fixtureName('https://api.pancakeswap.info/api/v2/pairs'): pairs,
+        fixtureName('https://api.pancakeswap.info/api/v2/summary'): _summary(pairs),
+    }
+    for coin, years in HISTORY_YEARS.items():
+        url = f'https://api.coingecko.com/api/v3/coins/{coin}/market_chart'
+        vol = 0.001 if coin.startswith('stable') else 0.04
+        fixtures[fixtureName(url, {'vs_currency': 'usd', 'days': 'max'})] = _history(rng, years, vol)
+    for coin in MARKET_COINS:
+        fixtures[fixtureName(f'https://api.coingecko.com/api/v3/coins/{coin}/tickers')] = _tickers(rng)
+
+    for name, payload in fixtures.items():
+        with open(os.path.join(path, name), 'w') as f:
+            json.dump(payload, f)
+    return len(fixtures)
@@ -0,0 +1,190 @@
+"""Offline benchmark suite for the compute and parse hot paths
+
+Every API call is served from JSON fixtures by ReplayTransport, so results only
+depend on the library code. Each case reports the best and median time of several
+repeats and its peak traced memory.
+
+    python benchmarks/run.py                          # run all cases
+    python benchmarks/run.py -k iloss -k pcs          # only cases matching any of the names
+    python benchmarks/run.py --save baseline.json     # store results as baseline
+    python benchmarks/run.py --compare baseline.json  # exit 1 if any case is slower than threshold x baseline
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import defi.defi_tools as dft
+from defi.backtest import farmBacktest
+from defi.transport import ReplayTransport, getTransport, setTransport
+from fixtures import writeFixtures
+
+
+N_SCENARIOS = 100_000
+rng = np.random.default_rng(0)
+VAR_A = rng.normal(0, 50, N_SCENARIOS).clip(-99)
+VAR_B = rng.normal(0, 50, N_SCENARIOS).clip(-99)
+DAYS = rng.integers(1, 365, N_SCENARIOS)
+
+
+def iloss_scalar():
+    ratios = (VAR_A / 100 + 1) / (VAR_B / 100 + 1)
+    return [dft.iloss(r, numerical=True) for r in ratios.tolist()]
+
+
+def iloss_batch():
+    return dft.iloss_array(var_A=VAR_A, var_B=VAR_B)
+
+
+def compare_scalar():
+    return [dft.compare(d, a, b, 0.01, 0.05, 0.2, 0.01)
+            for d, a, b in zip(DAYS.tolist(), VAR_A.tolist(), VAR_B.tolist())]
+
+
+def compare_batch():
+    return dft.compare_array(DAYS, VAR_A, VAR_B, 0.01, 0.05, 0.2, 0.01)
+
+
+def surface(grid_size):
+    return lambda: dft.iloss_surface(24.0, 534.0, 1000, 50, -25, grid_size=grid_size)
+
+
+def farm_prices(years):
+    pair = (f'coin-{years}y', f'stable-{years}y')
+    return pair, pd.concat({c: dft.geckoHistorical(c)['price'] for c in pair}, axis=1, sort=True)
+
+
+def farm_metrics(years):
+    pair, prices = farm_prices(years)
+    return lambda: farmBacktest([pair], [45], start='2000-01-01', prices=prices)
+
+
+def farm_frame(years):
+    _, prices = farm_prices(years)
+
+    def run():
+        with np.errstate(invalid='ignore'):  # pct_change of the iloss column starting at 0
+            return dft._farmFrame(prices, 45, '2000-01-01')
+    return run
+
+
+def pcs_payload(endpoint):
+    """decoded pancakeswap payload data & update time, so cases only time the DataFrame build"""
+    r = getTransport().get_json(f'https://api.pancakeswap.info/api/v2/{endpoint}')
+    return r['data'], datetime.datetime.fromtimestamp(r['updated_at'] / 1000)
+
+
+def pcs_frame(endpoint):
+    data, updated = pcs_payload(endpoint)
+    return lambda: dft._pcsFrame(data, endpoint, updated)
+
+
+def to_float_partial(endpoint):
+    data, _ = pcs_payload(endpoint)
+    return lambda: dft.toFloatPartial(pd.DataFrame.from_dict(data, orient='index'))
+
+
+CASES = {
+    'iloss_scalar_100k': iloss_scalar,
+    'iloss_batch_100k': iloss_batch,
+    'compare_scalar_100k': compare_scalar,
+    'compare_batch_100k': compare_batch,
+    'iloss_surface_100': surface(100),
+    'iloss_surface_300': surface(300),
+    'iloss_surface_1000': surface(1000),
+    'farm_metrics_1y': lambda: farm_metrics(1),
+    'farm_metrics_5y': lambda: farm_metrics(5),
+    'farm_metrics_10y': lambda: farm_metrics(10),
+    'farm_frame_1y': lambda: farm_frame(1),
+    'farm_frame_5y': lambda: farm_frame(5),
+    'farm_frame_10y': lambda: farm_frame(10),
+    'pcs_pairs_df': lambda: pcs_frame('pairs'),
+    'pcs_tokens_df': lambda: pcs_frame('tokens'),
+    'pcs_summary_df': lambda: pcs_frame('summary'),
+    'pcs_pairs_toFloatPartial': lambda: to_float_partial('pairs'),
+    'pcs_tokens_toFloatPartial': lambda: to_float_partial('tokens'),
+    'llama_protocols_df': lambda: dft.getProtocols,
+    'llama_protocols_compact': lambda: (lambda: dft.getProtocols(columns=['tvl', 'category', 'chain'],
+                                                                 compact=True)),
+    'llama_protocol_tvl': lambda: (lambda: dft.getProtocol('uniswap')),
+    'llama_chart': lambda: dft.getChart,
+    'gecko_markets_df': lambda: (lambda: dft.geckoMarkets('ethereum')),
+}
+
+# cases built from a setup function returning the callable to time
+SETUP_CASES = {k for k in CASES if k.startswith(('farm_', 'pcs_', 'llama_', 'gecko_'))}
+
+
+def measure(fn, repeat):
+    """best & median seconds over repeat calls, and peak traced memory of one call in MiB"""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'best_s': min(times), 'median_s': statistics.median(times), 'peak_mib': peak / 2**20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', action='append', default=[], help='run only cases containing this text')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--fixtures', help='fixtures directory, default: generated in a temporary directory')
+    parser.add_argument('--save', help='write results as JSON baseline')
+    parser.add_argument('--compare', help='baseline JSON to compare best times against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='max slowdown ratio vs baseline')
+    args = parser.parse_args()
+
+    tmp = None
+    if args.fixtures is None:
+        tmp = tempfile.TemporaryDirectory()
+        writeFixtures(tmp.name)
+    setTransport(ReplayTransport(args.fixtures or tmp.name))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results, regressions = {}, []
+    print(f"{'case':32} {'best ms':>10} {'median ms':>10} {'peak MiB':>9} {'vs base':>8}")
+    for name, case in CASES.items():
+        if args.k and not any(k in name for k in args.k):
+            continue
+        fn = case() if name in SETUP_CASES else case
+        res = results[name] = measure(fn, args.repeat)
+
+        ratio = ''
+        if name in baseline:
+            r = res['best_s'] / baseline[name]['best_s']
+            ratio = f'{r:.2f}x'
+            if r > args.threshold:
+                regressions.append(name)
+        print(f"{name:32} {res['best_s']*1000:10.2f} {res['median_s']*1000:10.2f} {res['peak_mib']:9.2f} {ratio:>8}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1)
+    if regressions:
+        print(f"Regressions over {args.threshold}x baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,461 @@
+"""asyncio counterparts of the Llama, CoinGecko & PancakeSwap fetchers
+
+Same names, arguments and results as in defi_tools, but coroutines sharing one pooled
+aiohttp session with bounded concurrency, so many fetches & simulations can be in flight
+in one event loop. Requires aiohttp (pip install defi[async]).
+
+    import asyncio
+    from defi import aio
+
+    async def main():
+        res = await asyncio.gather(*[aio.farmSimulate(pair, 25) for pair in pairs])
+        await aio.getAsyncTransport().close()
+
+farmSimulate() and iloss_simulate() here only compute, they don't plot.
+"""
+import asyncio
+import datetime
+import json
+import random
+import time
+
+import pandas as pd
+
+from . import defi_tools as _dft
+from .cache import getHistoryCache
+from .metrics import span
+from .transport import RETRY_STATUS
+
+
+def _aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError('defi.aio requires aiohttp, install it with: pip install aiohttp') from None
+    return aiohttp
+
+
+class HttpStatusError(Exception):
+    """HTTP error status still returned after all retries"""
+
+    def __init__(self, status, url):
+        super().__init__(f'{status} error for url: {url}')
+        self.status = status
+        self.url = url
+
+
+class AsyncTransport:
+    """Keep-alive pooled aiohttp transport with bounded concurrency, timeouts and retries
+        Same retry policy as HttpTransport
+
+    Args:
+        timeout (float, optional): total seconds per request, default 30
+        retries (int, optional): max retries on 429/5xx and connection errors, default 3
+        backoff (float, optional): base seconds for exponential backoff with full jitter, default 0.5
+        max_backoff (float, optional): max seconds to wait between retries, default 30
+        max_concurrency (int, optional): max requests in flight, also the connection pool size, default 20
+        headers (dict, optional): extra headers sent in every request
+    """
+
+    def __init__(self, timeout=30, retries=3, backoff=0.5, max_backoff=30, max_concurrency=20, headers=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_concurrency = max_concurrency
+        self.headers = {'Accept-Encoding': 'gzip, deflate', 'Accept': 'application/json', **(headers or {})}
+        self._session = self._semaphore = self._loop = None
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            aiohttp = _aiohttp()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout), headers=self.headers)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._session
+
+    async def _sleep(self, attempt, retry_after=''):
+        wait = float(retry_after) if retry_after.isdigit() else None
+        if wait is None:
+            wait = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        await asyncio.sleep(min(wait, self.max_backoff))
+
+    async def get_content(self, url, params=None):
+        """GET request with retries returning the raw (decompressed) body as bytes
+
+        Raises:
+            HttpStatusError: if the status is still 429/5xx after all retries, or any other 4xx/5xx
+            aiohttp.ClientError, asyncio.TimeoutError: if the connection still fails after all retries
+        """
+        aiohttp = _aiohttp()
+        session = self._get_session()
+        with span('http', url=url) as s:
+            for attempt in range(self.retries + 1):
+                last = attempt == self.retries
+                s.set(retries=attempt)
+                try:
+                    async with self._semaphore:
+                        async with session.get(url, params=params) as r:
+                            status, retry_after = r.status, r.headers.get('Retry-After', '')
+                            content = await r.read()
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if last:
+                        raise
+                    await self._sleep(attempt)
+                    continue
+
+                s.set(status=status)
+                if status not in RETRY_STATUS:
+                    if status >= 400:
+                        raise HttpStatusError(status, url)
+                    s.set(bytes=len(content))
+                    return content
+                if last:
+                    raise HttpStatusError(status, url)
+                await self._sleep(attempt, retry_after)
+
+    async def get_json(self, url, params=None):
+        """GET request returning the decoded JSON body"""
+        return json.loads(await self.get_content(url, params))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+_transport = None
+
+
+def getAsyncTransport():
+    """Transport used by all async fetchers, a default AsyncTransport is created on first use"""
+    global _transport
+    if _transport is None:
+        _transport = AsyncTransport()
+    return _transport
+
+
+def setAsyncTransport(transport):
+    """Replace the transport used by all async fetchers
+
+    Args:
+        transport: object with async get_json(url, params) and get_content(url, params) methods,
+            ie AsyncTransport(max_concurrency=100). None restores the default
+    """
+    global _transport
+    _transport = transport
+
+
+async def _acquire(rate_limit):
+    """async RateLimiter.acquire(), waits without blocking the event loop"""
+    wait = rate_limit.try_acquire()
+    while wait:
+        await asyncio.sleep(wait)
+        wait = rate_limit.try_acquire()
+
+
+async def _run(func, *args):
+    """run blocking (disk) work in the default executor"""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+######################################################################
+##                                                                  ##
+##      Llama API                                                   ##
+##                                                                  ##
+######################################################################
+
+
+async def getProtocols(columns=None, compact=False):
+    """async getProtocols(), list all DeFi protocols across all blockchains"""
+    url = "https://api.llama.fi/protocols"
+    return _dft._protocolsFrame(await getAsyncTransport().get_json(url), columns, compact)
+
+
+async def getProtocol(protocol, fields=None, compact=False):
+    """async getProtocol(), metrics and historic TVL for one DeFi dApp"""
+    url = f"https://api.llama.fi/protocol/{protocol}"
+    return _dft._protocolFrame(await getAsyncTransport().get_json(url), fields, compact)
+
+
+async def getChart(compact=False):
+    """async getChart(), historical TVL across all DeFi dApps"""
+    return _dft._chartFrame(await getAsyncTransport().get_json("https://api.llama.fi/charts"), compact)
+
+
+######################################################################
+##                                                                  ##
+##      CoinGecko API                                               ##
+##                                                                  ##
+######################################################################
+
+
+async def geckoPrice(tokens, quote):
+    """async geckoPrice(), price of combine pairs"""
+    url = "https://api.coingecko.com/api/v3/simple/price"
+    return await getAsyncTransport().get_json(url, {"ids": tokens, "vs_currencies": quote})
+
+
+async def geckoList(page=1, per_page=250):
+    """async geckoList(), full detail conGecko currency list"""
+    url = "https://api.coingecko.com/api/v3/coins/markets"
+    params = {"vs_currency": "usd", "order": "market_cap_desc", "per_page": per_page, "page": page}
+    return _dft._geckoListFrame(await getAsyncTransport().get_json(url, params))
+
+
+async def geckoListPages(pages=20, per_page=250, rate_limit=None, progress=None):
+    """async geckoListPages(), many pages downloaded concurrently
+
+    Args:
+        pages (int, optional): number of pages, default 20
+        per_page (int, optional): number of records per page, default 250
+        rate_limit (RateLimiter, optional): limiter shared by all requests, default 30 calls per minute
+        progress (callable, optional): called as progress(pages_done, pages) after each page
+
+    Returns:
+        DataFrame: list of full detail conGecko currency list, ordered by page
+    """
+    rate_limit = _dft._geckoRateLimiter() if rate_limit is None else rate_limit
+    done = 0
+
+    async def fetch(page):
+        nonlocal done
+        await _acquire(rate_limit)
+        df = await geckoList(page, per_page)
+        done += 1
+        if progress is not None:
+            progress(done, pages)
+        return df
+
+    return pd.concat(await asyncio.gather(*[fetch(page) for page in range(1, pages + 1)]))
+
+
+async def getGeckoIDs(pages=20, per_page=250, progress=None, **kwargs):
+    """async getGeckoIDs(), coinGecko IDs by marketCap rank"""
+    return (await geckoListPages(pages, per_page, progress=progress, **kwargs))['id'].tolist()
+
+
+async def _geckoTickers(ticker, pages, rate_limit=None):
+    url = f"https://api.coingecko.com/api/v3/coins/{ticker}/tickers"
+    tickers, page = [], 1
+    while pages is None or page <= pages:
+        if rate_limit is not None:
+            await _acquire(rate_limit)
+        r = (await getAsyncTransport().get_json(url, {'page': page} if page > 1 else None))['tickers']
+        tickers.extend(r)
+        if len(r) < 100:
+            break
+        page += 1
+    return tickers
+
+
+async def geckoMarkets(ticker, pages=1):
+    """async geckoMarkets(), top markets for a coin"""
+    df = _dft._geckoTickersFrame(await _geckoTickers(ticker, pages))
+    return df.sort_values('volume_usd', ascending=False)
+
+
+async def geckoMarketsBatch(tickers, pages=None, rate_limit=None):
+    """async geckoMarketsBatch(), markets for many coins downloaded concurrently
+
+    Args:
+        tickers (list): gecko IDs, ie ["bitcoin", "ethereum"]
+        pages (int, optional): max pages of 100 markets for each coin, None (default) follows all pages
+        rate_limit (RateLimiter, optional): limiter shared by all requests, default 30 calls per minute
+
+    Returns:
+        DataFrame: Full detail markets indexed by (coin, exchange). Coins that failed are left out,
+            with their error message in df.attrs['errors']
+    """
+    rate_limit = _dft._geckoRateLimiter() if rate_limit is None else rate_limit
+    results = await asyncio.gather(*[_geckoTickers(coin, pages, rate_limit) for coin in tickers],
+                                   return_exceptions=True)
+    errors = {coin: f'{type(r).__name__}: {r}' for coin, r in zip(tickers, results) if isinstance(r, Exception)}
+    return _dft._geckoMarketsFrame(dict(zip(tickers, results)), errors)
+
+
+async def geckoHistorical(ticker, vs_currency='usd', days='max', cache=None):
+    """async geckoHistorical(), historical prices using the same history cache"""
+    return await _geckoHistory(f"coins/{ticker}", ticker, vs_currency, days, cache)
+
+
+async def geckoHistoricalContract(address, platform='binance-smart-chain', vs_currency='usd', days='max', cache=None):
+    """async geckoHistoricalContract(), historical prices for a token contract address"""
+    address = address.lower()
+    return await _geckoHistory(f"coins/{platform}/contract/{address}", f"{platform}_{address}",
+                               vs_currency, days, cache)
+
+
+async def _geckoChart(path, vs_currency, days, interval=None):
+    url = f"https://api.coingecko.com/api/v3/{path}/market_chart"
+    params = {"vs_currency": vs_currency, "days": days}
+    if interval:
+        params['interval'] = interval
+    return _dft._geckoChartFrame(await getAsyncTransport().get_json(url, params))
+
+
+async def _geckoHistory(path, key, vs_currency, days, cache):
+    cache = getHistoryCache() if cache is None else cache
+    if cache is None or days != 'max':
+        return await _geckoChart(path, vs_currency, days)
+
+    with span('cache', key=key) as s:
+        cached, fetched_at = await _run(cache.load, key, vs_currency)
+        if cached is not None and cache.is_fresh(fetched_at):
+            s.set(cache='hit')
+            return cached
+
+        if cached is None or cached.empty:
+            s.set(cache='miss')
+            df = await _geckoChart(path, vs_currency, days)
+        else:
+            s.set(cache='partial')
+            tail_days = (pd.Timestamp.now('UTC').tz_localize(None) - cached.index[-1]).days + 2
+            tail = await _geckoChart(path, vs_currency, tail_days, interval='daily')
+            df = _dft._mergeTail(cached, tail)
+
+        await _run(cache.save, key, vs_currency, df)
+        return df
+
+
+async def farmSimulate(pair, apr, start='2021-01-01'):
+    """async farmSimulate() without plot, both histories are downloaded concurrently
+
+    Args:
+        pair (list): gecko IDs list ["bitcoin",'tether']
+        apr (float): ie 25 (for 25% Anual rewards)
+        start (str, optional): ISO Format YYYY-MM-DD ie "2021-01-01", "2021-01-01" (default)
+
+    Returns:
+        Dict: Full farming strategy results, same as farmSimulate()
+
+    Raises:
+        the download error of the first coin without history
+    """
+    with span('farmSimulate.download'):
+        histories = await asyncio.gather(*[geckoHistorical(coin) for coin in pair])
+    with span('farmSimulate.compute'):
+        prices = pd.concat({coin: df['price'] for coin, df in zip(pair, histories)}, axis=1, sort=True)
+        farm = _dft._farmFrame(prices, apr, start)[0]
+        return _dft._farmResult(pair, apr, start, farm)
+
+
+######################################################################
+##                                                                  ##
+##       Pancake Swap API                                           ##
+##                                                                  ##
+######################################################################
+
+
+async def _pcsGet(endpoint, as_df):
+    url = f"https://api.pancakeswap.info/api/v2/{endpoint}"
+    return _dft._pcsParse(await getAsyncTransport().get_json(url), endpoint, as_df)
+
+
+async def pcsSummary(as_df=True):
+    """async pcsSummary(), 24h volume, price and liquidity for all pancakeswap pairs"""
+    return await _pcsGet('summary', as_df)
+
+
+async def pcsTokens(as_df=True):
+    """async pcsTokens(), all tokens listed in pancakeswap"""
+    return await _pcsGet('tokens', as_df)
+
+
+async def pcsPairs(as_df=True):
+    """async pcsPairs(), top 1000 pancakeswap pairs"""
+    return await _pcsGet('pairs', as_df)
+
+
+async def pcsSnapshot():
+    """async pcsSnapshot(), summary, tokens and pairs downloaded concurrently"""
+    endpoints = ['summary', 'tokens', 'pairs']
+    payloads = dict(zip(endpoints, await asyncio.gather(*[_pcsGet(e, as_df=False) for e in endpoints])))
+    updated = datetime.datetime.fromtimestamp(min(r.get('updated_at') for r in payloads.values())/1000)
+    res = {e: _dft._pcsFrame(payloads[e].get('data', None), e, updated) for e in endpoints}
+    res['updated'] = updated
+    return res
+
+
+class AsyncPcsIndex:
+    """async PcsIndex, concurrent lookups share one download per endpoint and ttl
+
+    Args:
+        ttl (float, optional): seconds before refreshing tokens & pairs data, default 60
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._data = {}
+        self._locks = {}
+
+    async def _index(self, endpoint, build):
+        lock = self._locks.setdefault(endpoint, asyncio.Lock())
+        async with lock:
+            index, fetched_at = self._data.get(endpoint, (None, -float('inf')))
+            if time.monotonic() - fetched_at >= self.ttl:
+                index = build((await _pcsGet(endpoint, as_df=False)).get('data', None))
+                self._data[endpoint] = (index, time.monotonic())
+            return index
+
+    async def token(self, search):
+        """token info by symbol or contract address (case insensitive), None if not found"""
+        search = 'WBNB' if search.upper() == 'BNB' else search
+        return (await self._index('tokens', _dft._pcsTokensIndex)).get(search.upper())
+
+    async def pair(self, base, quote):
+        """pair info by base and quote symbols in any order (case insensitive), None if not found"""
+        base = 'WBNB' if base.upper() == 'BNB' else base
+        quote = 'WBNB' if quote.upper() == 'BNB' else quote
+        return (await self._index('pairs', _dft._pcsPairsIndex)).get(frozenset((base.upper(), quote.upper())))
+
+    def clear(self):
+        self._data.clear()
+
+
+_pcs_index = AsyncPcsIndex()
+
+
+async def pcsTokenInfo(search, index=None):
+    """async pcsTokenInfo(), info from a token or a list of tokens"""
+    index = _pcs_index if index is None else index
+    if not isinstance(search, str):
+        return list(await asyncio.gather(*[pcsTokenInfo(s, index) for s in search]))
+
+    res = await index.token(search)
+    return f"Not found: {search}" if res is None else res
+
+
+async def pcsPairInfo(base, quote=None, index=None):
+    """async pcsPairInfo(), info from a token pair LP or a list of (base, quote) tuples"""
+    index = _pcs_index if index is None else index
+    if quote is None:
+        return list(await asyncio.gather(*[pcsPairInfo(b, q, index) for b, q in base]))
+
+    res = await index.pair(base, quote)
+    return f"Not found: {base}-{quote}" if res is None else res
+
+
+async def iloss_simulate(base_token, quote_token, value=100, base_pct_chg=0, quote_pct_chg=0, index=None):
+    """async iloss_simulate() without plot, with real time prices from pancakeswap API
+        Only the final value is computed, use iloss_surface() with the prices for the full surface
+
+    Args:
+        base_token (string): Pair first token, ie CAKE
+        quote_token (string): Pais second token, ie BNB
+        value (int, optional): Value investen in LP default=100
+        base_pct_chg (int, optional): value assming will change first token of LP pair, ie 10 (for +10% change)
+        quote_pct_chg (int, optional): value assming will change first token of LP pair, ie -30 (for -30% change)
+        index (AsyncPcsIndex, optional): snapshot used for token prices, default is shared with a 60 seconds ttl
+
+    Returns:
+        tuple (value_f, iloss): final value of value invested, and decimal impermanent loss
+    """
+    index = _pcs_index if index is None else index
+    with span('iloss_simulate.prices'):
+        base, quote = await asyncio.gather(index.token(base_token), index.token(quote_token))
+        px_base, px_quote = float(base['price']), float(quote['price'])
+    res = _dft._ilossFinal(px_base, px_quote, value, base_pct_chg, quote_pct_chg)
+    return res['value_f'], res['iloss_f']
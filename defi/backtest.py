@@ -0,0 +1,258 @@
+"""Vectorized farming backtests for many pairs and APRs at once
+
+Same strategy as defi_tools.farmSimulate(), computed with numpy arrays shaped
+(time x pair) or (time x pair x APR) and without plotting. entryArrays() and
+farmEntries() compute it for every start date at once.
+"""
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .defi_tools import _iloss, geckoHistorical
+from .panel import PricePanel
+
+
+def _lastValidIndex(valid):
+    """index of the last valid row up to each row (0 before the first valid one), along axis 0"""
+    rows = np.arange(valid.shape[0]).reshape((-1,) + (1,) * (valid.ndim - 1))
+    return np.maximum.accumulate(np.where(valid, rows, 0), axis=0)
+
+
+def seriesStats(values, valid, periods=365):
+    """CAGR, annualized volatility, sharpe and max drawdown for value series normalized to start at 1
+
+    Args:
+        values (ndarray): (time x ...) values, NaN where not valid
+        valid (ndarray): bool mask broadcastable to values, rows used for each series
+        periods (int, optional): periods per year, default 365 (daily)
+
+    Returns:
+        dict: 'cagr', 'volatility', 'sharpe', 'max_drawdown' arrays with values shape without time axis
+    """
+    valid = np.broadcast_to(valid, values.shape)
+    n = valid.sum(axis=0)
+    last = _lastValidIndex(valid)
+    final = np.take_along_axis(values, last[-1:], axis=0)[0]
+
+    prev = np.concatenate([last[:1], last[:-1]])
+    prev_values = np.take_along_axis(values, prev, axis=0)
+    has_prev = valid & (np.cumsum(valid, axis=0) > 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.where(has_prev, values / prev_values - 1, np.nan)
+        cagr = final ** (periods / n) - 1
+        volatility = np.nanstd(returns, axis=0, ddof=1) * periods**0.5
+        sharpe = cagr / volatility
+        drawdown = values / np.fmax.accumulate(values, axis=0) - 1
+    max_drawdown = np.nanmin(np.where(valid, drawdown, np.nan), axis=0)
+
+    return {'cagr': cagr, 'volatility': volatility, 'sharpe': sharpe, 'max_drawdown': max_drawdown}
+
+
+def backtestArrays(prices_a, prices_b, aprs):
+    """Farming strategy for many pairs and APRs, as arrays
+
+    Args:
+        prices_a (array_like): (time x pair) prices for first token of each pair, NaN if missing
+        prices_b (array_like): (time x pair) prices for second token of each pair, NaN if missing
+        aprs (array_like): APR values, ie [10, 25, 50] (for 10%, 25% & 50% anual rewards)
+
+    Returns:
+        dict of ndarrays:
+            'valid' (time x pair): rows with both prices, as the dropna() in farmSimulate
+            'token_a', 'token_b', 'ratio', 'iloss', 'buy_hold' (time x pair): normalized to first valid row
+            'rewards', 'farm' (time x pair x APR): cumulative rewards and farming strategy value
+    """
+    a = np.asarray(prices_a, dtype=float)
+    b = np.asarray(prices_b, dtype=float)
+    aprs = np.atleast_1d(np.asarray(aprs, dtype=float))
+
+    valid = ~(np.isnan(a) | np.isnan(b))
+    first = valid.argmax(axis=0)[np.newaxis, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(valid, a / np.take_along_axis(a, first, axis=0), np.nan)
+        b = np.where(valid, b / np.take_along_axis(b, first, axis=0), np.nan)
+        ratio = b / a
+        iloss = _iloss(ratio)
+    buy_hold = (a + b) / 2
+
+    days = np.where(valid, np.cumsum(valid, axis=0), np.nan)
+    rewards = days[:, :, np.newaxis] * (aprs / 100 / 365)
+    farm = (buy_hold * (1 + iloss))[:, :, np.newaxis] * (1 + rewards)
+
+    return {'valid': valid, 'token_a': a, 'token_b': b, 'ratio': ratio, 'iloss': iloss,
+            'buy_hold': buy_hold, 'rewards': rewards, 'farm': farm}
+
+
+def _backtestChunk(prices_a, prices_b, aprs):
+    res = backtestArrays(prices_a, prices_b, aprs)
+    valid = res['valid']
+    last = _lastValidIndex(valid)[-1:]
+
+    def final(x):
+        idx = last if x.ndim == 2 else last[:, :, np.newaxis]
+        return np.take_along_axis(x, np.broadcast_to(idx, (1,) + x.shape[1:]), axis=0)[0]
+
+    stats_bh = seriesStats(res['buy_hold'], valid)
+    stats_farm = seriesStats(res['farm'], valid[:, :, np.newaxis])
+    return {'days': valid.sum(axis=0), 'buy_hold': final(res['buy_hold']) - 1, 'iloss': final(res['iloss']),
+            'rewards': final(res['rewards']), 'farm': final(res['farm']) - 1,
+            'stats_buy_hold': stats_bh, 'stats_farm': stats_farm}
+
+
+def entryArrays(prices_a, prices_b, aprs, window=None):
+    """Final farming strategy results for every start date at once, as arrays
+
+    Each row is the result of farmSimulate() started that day, computed from the start and
+    end prices of each row, so all start dates take O(time) instead of one simulation each.
+
+    Args:
+        prices_a (array_like): (time x pair) prices for first token of each pair, NaN if missing
+        prices_b (array_like): (time x pair) prices for second token of each pair, NaN if missing
+        aprs (array_like): APR values, ie [10, 25, 50] (for 10%, 25% & 50% anual rewards)
+        window (int, optional): days held, counting the start day (len(farm) in farmSimulate). Only rows with
+            both prices are counted, so gaps extend the window. None (default) holds until the last date
+
+    Returns:
+        dict of ndarrays:
+            'valid' (time x pair): start rows with both prices and a full window
+            'end' (time x pair): last row used for each start
+            'days', 'token_a', 'token_b', 'iloss', 'buy_hold' (time x pair): final values normalized to the start
+            'rewards', 'farm' (time x pair x APR): final rewards and farming strategy value
+    """
+    a = np.asarray(prices_a, dtype=float)
+    b = np.asarray(prices_b, dtype=float)
+    aprs = np.atleast_1d(np.asarray(aprs, dtype=float))
+
+    valid = ~(np.isnan(a) | np.isnan(b))
+    count = np.cumsum(valid, axis=0)
+    last = _lastValidIndex(valid)
+    if window is None:
+        end = np.broadcast_to(last[-1:], valid.shape)
+    else:
+        # end is the first row where the valid rows count reaches the start count + window - 1,
+        # searched at once in all columns stacked with offsets so they stay sorted
+        n, m = valid.shape
+        target = count + (window - 1)
+        offsets = np.arange(m) * (n + 1)
+        pos = np.searchsorted((count + offsets).ravel(order='F'), (target + offsets).ravel(order='F'))
+        rows = np.clip(pos.reshape(m, n).T - np.arange(m) * n, 0, n - 1)
+        full = target <= count[-1]
+        end = np.where(full, rows, last[-1])
+        valid = valid & full
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        token_a = np.where(valid, np.take_along_axis(a, end, axis=0) / a, np.nan)
+        token_b = np.where(valid, np.take_along_axis(b, end, axis=0) / b, np.nan)
+        iloss = _iloss(token_b / token_a)
+    buy_hold = (token_a + token_b) / 2
+
+    days = np.where(valid, np.take_along_axis(count, end, axis=0) - count + 1, 0)
+    rewards = np.where(valid, days, np.nan)[:, :, np.newaxis] * (aprs / 100 / 365)
+    farm = (buy_hold * (1 + iloss))[:, :, np.newaxis] * (1 + rewards)
+
+    return {'valid': valid, 'end': end, 'days': days, 'token_a': token_a, 'token_b': token_b,
+            'iloss': iloss, 'buy_hold': buy_hold, 'rewards': rewards, 'farm': farm}
+
+
+def farmEntries(pair, apr, windows=None, start=None, end=None, prices=None):
+    """farmSimulate() final results for every possible start date, ie to study entry timing
+
+    Args:
+        pair (list): gecko IDs list ["bitcoin",'tether']
+        apr (float): ie 25 (for 25% Anual rewards)
+        windows (list, optional): days held, ie [30, 90, 365]. None (default) holds every start until the last date
+        start (str, optional): ISO Format YYYY-MM-DD, first start date, default all history
+        end (str, optional): ISO Format YYYY-MM-DD, last date of prices used, default all history
+        prices (DataFrame or PricePanel, optional): date indexed prices with a column per gecko ID,
+            if None prices are downloaded with geckoHistorical()
+
+    Returns:
+        DataFrame: start date indexed days held, buy_hold return, iloss, rewards & farm return, where farm is the
+            final farming strategy value - 1, buy_hold * (1 + iloss) * (1 + rewards) on values normalized to 1, as
+            farmBacktest(). farmSimulate() 'Farming + Rewards - IL' is a different figure.
+            With windows, columns are (window, result)
+    """
+    pair = list(pair)
+    if prices is None:
+        prices = pd.concat({c: geckoHistorical(c)['price'] for c in pair}, axis=1, sort=True)
+    if isinstance(prices, PricePanel):
+        prices = prices.frame('price', pair, end=end)
+    else:
+        prices = prices[pair] if end is None else prices.loc[prices.index <= pd.Timestamp(end), pair]
+    matrix = prices.to_numpy(dtype=float)
+    first = 0 if start is None else prices.index.searchsorted(pd.Timestamp(start))
+
+    frames = {}
+    for window in [None] if windows is None else windows:
+        res = entryArrays(matrix[:, :1], matrix[:, 1:], apr, window)
+        valid = res['valid'][first:, 0]
+        frames[window] = pd.DataFrame({'days': res['days'][first:, 0][valid],
+                                       'buy_hold': res['buy_hold'][first:, 0][valid] - 1,
+                                       'iloss': res['iloss'][first:, 0][valid],
+                                       'rewards': res['rewards'][first:, 0, 0][valid],
+                                       'farm': res['farm'][first:, 0, 0][valid] - 1},
+                                      index=prices.index[first:][valid].rename('start'))
+    if windows is None:
+        return frames[None]
+    return pd.concat(frames, axis=1, names=['window', None])
+
+
+def farmBacktest(pairs, aprs, start='2021-01-01', prices=None, chunk_size=64, processes=None):
+    """Backtest the farming strategy of farmSimulate() for many pairs & APRs at once, without plots
+
+    Args:
+        pairs (list): list of gecko IDs pairs [["bitcoin", "tether"], ["ethereum", "tether"]]
+        aprs (float or list): ie [10, 25, 50] (for 10%, 25% & 50% anual rewards)
+        start (str, optional): ISO Format YYYY-MM-DD ie "2021-01-01", "2021-01-01" (default)
+        prices (DataFrame or PricePanel, optional): date indexed prices with a column per gecko ID,
+            if None prices are downloaded once per coin with geckoHistorical()
+        chunk_size (int, optional): pairs computed together, bounds memory to (time x chunk_size x APR) arrays
+        processes (int, optional): if given, chunks of pairs are computed in a process pool of this size
+
+    Returns:
+        DataFrame: one row per pair & APR with final buy & hold, impermanent loss, rewards and farm returns,
+            and CAGR, volatility, sharpe & max drawdown for buy & hold and farm strategies
+    """
+    pairs = [tuple(p) for p in pairs]
+    aprs = np.atleast_1d(np.asarray(aprs, dtype=float))
+    if prices is None:
+        coins = list(dict.fromkeys(c for p in pairs for c in p))
+        prices = pd.concat({c: geckoHistorical(c)['price'] for c in coins}, axis=1, sort=True)
+
+    start = datetime.datetime.strptime(start, '%Y-%m-%d')
+    if isinstance(prices, PricePanel):
+        matrix = prices.values('price', start=start)
+        columns = {c: i for i, c in enumerate(prices.coins)}
+    else:
+        prices = prices.loc[prices.index >= start]
+        columns = {c: i for i, c in enumerate(prices.columns)}
+        matrix = prices.to_numpy(dtype=float)
+
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    args = [(matrix[:, [columns[a] for a, _ in chunk]], matrix[:, [columns[b] for _, b in chunk]], aprs)
+            for chunk in chunks]
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(_backtestChunk, *zip(*args)))
+    else:
+        results = [_backtestChunk(*arg) for arg in args]
+
+    frames = []
+    for chunk, res in zip(chunks, results):
+        n_pairs, n_aprs = len(chunk), len(aprs)
+        rep = lambda x: np.repeat(x, n_aprs)
+        data = {'token_1': rep([a for a, _ in chunk]), 'token_2': rep([b for _, b in chunk]),
+                'apr': np.tile(aprs, n_pairs), 'days': rep(res['days']),
+                'buy_hold': rep(res['buy_hold']), 'iloss': rep(res['iloss']),
+                'rewards': res['rewards'].ravel(), 'farm': res['farm'].ravel()}
+        for name, stats in (('buy_hold', res['stats_buy_hold']), ('farm', res['stats_farm'])):
+            for stat, values in stats.items():
+                data[f'{stat}_{name}'] = values.ravel() if values.ndim == 2 else rep(values)
+        frames.append(pd.DataFrame(data))
+
+    df = pd.concat(frames, ignore_index=True)
+    df.insert(2, 'start', start.isoformat()[:10])
+    return df
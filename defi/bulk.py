@@ -0,0 +1,218 @@
+"""Resumable bulk download of coinGecko histories
+
+BulkDownload fetches geckoHistorical() for thousands of gecko IDs under one global rate
+limit, highest priority first. Requests go through a transport without its own retries,
+so every HTTP request takes a limiter token and retries are only done by the job. Histories are stored in a HistoryCache and every status
+change is appended to a JSON lines manifest, so an interrupted run resumes where it
+stopped, and the rate limiter state is restored from it so a restart does not burst
+over the API limit. Failures are retried with exponential backoff, a 429 pauses every
+request, and results are reported per ID in a DataFrame instead of prints.
+
+    job = BulkDownload(getGeckoIDs(), '~/.cache/defi/bulk')
+    status = job.run()
+    status[status.status == 'failed']
+"""
+import heapq
+import json
+import os
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+from .cache import HistoryCache, getHistoryCache
+from .defi_tools import _geckoHistory, _geckoRateLimiter
+from .transport import RETRY_STATUS, HttpTransport
+
+
+STATUS_COLUMNS = ['status', 'attempts', 'rows', 'first', 'last', 'seconds', 'error', 'updated']
+
+
+def _retryable(error):
+    """(retry, seconds to wait from Retry-After or None, rate limited) for a fetch error"""
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        status = None if response is None else response.status_code
+        retry_after = '' if response is None else response.headers.get('Retry-After', '')
+        wait = float(retry_after) if retry_after.isdigit() else None
+        return status is None or status in RETRY_STATUS, wait, status == 429
+    return isinstance(error, (requests.ConnectionError, requests.Timeout)), None, False
+
+
+class BulkDownload:
+    """Checkpointed, rate limited download of many coinGecko histories
+
+    Args:
+        ids (list): gecko IDs, ie getGeckoIDs()
+        path (str, optional): directory for the manifest, default "~/.cache/defi/bulk"
+        priorities (dict, optional): {id: priority}, lower is downloaded first. Default the position in ids
+        vs_currency (str, optional): ie "usd" (default)
+        rate_limit (RateLimiter, optional): global limit for all requests, default 30 calls per minute
+        max_workers (int, optional): max concurrent requests, default 4
+        retries (int, optional): max retries per ID after the first attempt, default 5
+        backoff (float, optional): base seconds for exponential backoff with jitter, default 10
+        max_backoff (float, optional): max seconds to wait before a retry, default 600
+        cache (HistoryCache, optional): where histories are stored, default the geckoHistorical() cache
+            or a HistoryCache in path/history
+        retry_failed (bool, optional): download again IDs that failed in previous runs, default False
+        transport (optional): transport for all requests, default HttpTransport(retries=0). It should not
+            retry by itself, or retries would bypass rate_limit
+    """
+
+    def __init__(self, ids, path='~/.cache/defi/bulk', priorities=None, vs_currency='usd', rate_limit=None,
+                 max_workers=4, retries=5, backoff=10, max_backoff=600, cache=None, retry_failed=False,
+                 transport=None):
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest = os.path.join(self.path, 'manifest.jsonl')
+        self.ids = list(dict.fromkeys(ids))
+        self.priorities = {} if priorities is None else priorities
+        self.vs_currency = vs_currency
+        self.rate_limit = _geckoRateLimiter() if rate_limit is None else rate_limit
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        cache = getHistoryCache() if cache is None else cache
+        self.cache = HistoryCache(os.path.join(self.path, 'history'), max_age=None) if cache is None else cache
+        self.retry_failed = retry_failed
+        self.transport = HttpTransport(retries=0) if transport is None else transport
+        self.records = self._load()
+
+    def _load(self):
+        """Last record of every ID in the manifest, and restore the rate limiter state"""
+        records, lines, last = {}, 0, None
+        if os.path.exists(self.manifest):
+            with open(self.manifest) as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # line cut by a crash while writing
+                    records[rec['id']] = last = rec
+                    lines += 1
+        if last is not None:
+            self.rate_limit.reset(last['tokens'] + (time.time() - last['updated']) * self.rate_limit.rate)
+        if lines > 2 * len(records):
+            self._compact(records)
+        return records
+
+    def _compact(self, records):
+        tmp = self.manifest + '.tmp'
+        with open(tmp, 'w') as f:
+            for rec in sorted(records.values(), key=lambda r: r['updated']):
+                f.write(json.dumps(rec) + '\n')
+        os.replace(tmp, self.manifest)
+
+    def _write(self, log, rec):
+        rec['updated'] = time.time()
+        rec['tokens'] = self.rate_limit.available()
+        self.records[rec['id']] = rec
+        log.write(json.dumps(rec) + '\n')
+        log.flush()
+
+    def _fetch(self, ticker, done):
+        t0 = time.perf_counter()
+        try:
+            df = _geckoHistory(f'coins/{ticker}', ticker, self.vs_currency, 'max', self.cache, self.transport)
+            error = None
+        except Exception as e:
+            df, error = None, e
+        done.put((ticker, df, error, time.perf_counter() - t0))
+
+    def _pending(self):
+        """IDs still to download, as a (priority, position, id) heap"""
+        skip = ('done', 'failed') if not self.retry_failed else ('done',)
+        heap = [(self.priorities.get(c, i), i, c) for i, c in enumerate(self.ids)
+                if self.records.get(c, {}).get('status') not in skip]
+        heapq.heapify(heap)
+        return heap
+
+    def _finished(self, log, ticker, df, error, seconds):
+        """Record a fetch result, returns (seconds to wait before a retry or None, status record)"""
+        rec = dict(self.records.get(ticker) or {'id': ticker, 'attempts': 0})
+        rec.update(attempts=rec['attempts'] + 1, seconds=round(seconds, 3), error=None)
+        wait = None
+        if error is None:
+            rec.update(status='done', rows=len(df),
+                       first=None if df.empty else str(df.index[0].date()),
+                       last=None if df.empty else str(df.index[-1].date()))
+        else:
+            retry, retry_after, limited = _retryable(error)
+            rec['error'] = f'{type(error).__name__}: {error}'
+            if retry and rec['attempts'] <= self.retries:
+                wait = min(self.max_backoff, self.backoff * 2**(rec['attempts'] - 1))
+                wait = retry_after if retry_after is not None else random.uniform(wait / 2, wait)
+                if limited:
+                    self._pause_until = max(self._pause_until, time.monotonic() + wait)
+                rec['status'] = 'retry'
+            else:
+                rec['status'] = 'failed'
+        self._write(log, rec)
+        return wait, rec
+
+    def run(self, progress=None):
+        """Download every pending ID, resuming from the manifest
+
+        Args:
+            progress (callable, optional): called with the status record (dict) of each finished attempt
+
+        Returns:
+            DataFrame: status() of all IDs after the run
+        """
+        ready, delayed, running = self._pending(), [], 0
+        positions = {c: i for i, c in enumerate(self.ids)}
+        done = queue.Queue()
+        self._pause_until = 0
+        with open(self.manifest, 'a') as log, ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while ready or delayed or running:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    heapq.heappush(ready, heapq.heappop(delayed)[1:])
+
+                timeout = delayed[0][0] - now if delayed else None
+                if ready and running < self.max_workers:
+                    wait = self._pause_until - now
+                    wait = self.rate_limit.try_acquire() if wait <= 0 else wait
+                    if wait == 0:
+                        item = heapq.heappop(ready)
+                        rec = dict(self.records.get(item[2]) or {'id': item[2], 'attempts': 0})
+                        rec['status'] = 'running'
+                        self._write(log, rec)
+                        pool.submit(self._fetch, item[2], done)
+                        running += 1
+                        continue
+                    timeout = wait if timeout is None else min(timeout, wait)
+
+                try:
+                    ticker, df, error, seconds = done.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+                running -= 1
+                wait, rec = self._finished(log, ticker, df, error, seconds)
+                if wait is not None:
+                    position = positions[ticker]
+                    heapq.heappush(delayed, (time.monotonic() + wait, self.priorities.get(ticker, position),
+                                             position, ticker))
+                if progress is not None:
+                    progress(rec)
+        return self.status()
+
+    def status(self):
+        """Status of every ID: pending, running (interrupted), retry, done or failed
+
+        Returns:
+            DataFrame: id indexed, with attempts, history rows, first & last dates, seconds of the
+                last attempt, last error and update time
+        """
+        rows = [self.records.get(c, {'status': 'pending', 'attempts': 0}) for c in self.ids]
+        df = pd.DataFrame(rows, index=pd.Index(self.ids, name='id'), columns=STATUS_COLUMNS)
+        df['updated'] = pd.to_datetime(df['updated'], unit='s')
+        return df
+
+    def load(self, ticker):
+        """Downloaded history of an ID, same as geckoHistorical(), None if not downloaded"""
+        return self.cache.load(ticker, self.vs_currency)[0]
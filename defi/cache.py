@@ -0,0 +1,144 @@
+"""On disk cache for coinGecko price histories
+
+Histories are stored as one structured numpy array (date & values) per (ticker, vs_currency)
+directory, replaced atomically on save and loaded memory-mapped. geckoHistorical() uses the cache set with setHistoryCache(),
+and on later calls only downloads the missing tail of the history.
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+
+HISTORY_COLUMNS = ['price', 'market_caps', 'total_volumes']
+HISTORY_DTYPE = np.dtype([('date', np.int64)] + [(c, np.float64) for c in HISTORY_COLUMNS])
+ACCESS_RESOLUTION = 60  # seconds, accessed_at is only rewritten when older than this
+
+
+class HistoryCache:
+    """Persistent incremental cache for geckoHistorical price histories
+
+    Args:
+        path (string, optional): cache directory, default "~/.cache/defi/history"
+        max_age (float, optional): seconds before a cached history is refreshed, default 6 hours.
+            None never refreshes
+        max_entries (int, optional): max histories stored, least recently used are evicted. None (default) no limit.
+            Access times are only tracked (written to disk, at most once a minute per history) when set
+    """
+
+    def __init__(self, path='~/.cache/defi/history', max_age=6*3600, max_entries=None):
+        self.path = os.path.expanduser(path)
+        self.max_age = max_age
+        self.max_entries = max_entries
+
+    def _dir(self, ticker, vs_currency):
+        return os.path.join(self.path, vs_currency.lower(), ticker.lower())
+
+    def _read_meta(self, folder):
+        with open(os.path.join(folder, 'meta.json')) as f:
+            return json.load(f)
+
+    def _write_meta(self, folder, meta):
+        tmp = os.path.join(folder, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(folder, 'meta.json'))
+
+    def load(self, ticker, vs_currency='usd'):
+        """Cached history for a coin
+
+        Returns:
+            tuple (DataFrame, float): history with same shape as geckoHistorical() and
+                fetch timestamp, (None, None) if not cached or unreadable
+        """
+        folder = self._dir(ticker, vs_currency)
+        try:
+            meta = self._read_meta(folder)
+            history = np.load(os.path.join(folder, 'history.npy'), mmap_mode='r')
+            if history.dtype != HISTORY_DTYPE:
+                return None, None
+        except (OSError, ValueError):
+            return None, None
+
+        now = time.time()
+        if self.max_entries is not None and now - meta.get('accessed_at', 0) > ACCESS_RESOLUTION:
+            meta['accessed_at'] = now
+            self._write_meta(folder, meta)
+
+        index = pd.DatetimeIndex(np.asarray(history['date']).astype('datetime64[ns]'), name='date')
+        values = np.column_stack([history[c] for c in HISTORY_COLUMNS])
+        df = pd.DataFrame(values, index=index, columns=HISTORY_COLUMNS)
+        return df, meta['fetched_at']
+
+    def is_fresh(self, fetched_at):
+        return self.max_age is None or time.time() - fetched_at < self.max_age
+
+    def save(self, ticker, vs_currency, df):
+        """Store a full history (DataFrame as returned by geckoHistorical) replacing the cached one"""
+        folder = self._dir(ticker, vs_currency)
+        os.makedirs(folder, exist_ok=True)
+
+        history = np.empty(len(df), dtype=HISTORY_DTYPE)
+        history['date'] = df.index.values.astype('datetime64[ns]').astype(np.int64)
+        for c in HISTORY_COLUMNS:
+            history[c] = df[c].to_numpy(dtype=np.float64)
+        tmp = os.path.join(folder, 'history.tmp.npy')
+        np.save(tmp, history)
+        os.replace(tmp, os.path.join(folder, 'history.npy'))
+
+        now = time.time()
+        self._write_meta(folder, {'ticker': ticker, 'vs_currency': vs_currency,
+                                  'fetched_at': now, 'accessed_at': now, 'rows': len(df)})
+        self.evict()
+
+    def entries(self):
+        """List cached histories
+
+        Returns:
+            list: dicts with ticker, vs_currency, fetched_at, accessed_at & rows
+        """
+        res = []
+        if not os.path.isdir(self.path):
+            return res
+        for currency in os.listdir(self.path):
+            for ticker in os.listdir(os.path.join(self.path, currency)):
+                try:
+                    res.append(self._read_meta(os.path.join(self.path, currency, ticker)))
+                except (OSError, ValueError):
+                    pass
+        return res
+
+    def evict(self):
+        """Remove least recently used histories over max_entries"""
+        if self.max_entries is None:
+            return
+        entries = sorted(self.entries(), key=lambda m: m['accessed_at'], reverse=True)
+        for meta in entries[self.max_entries:]:
+            self.remove(meta['ticker'], meta['vs_currency'])
+
+    def remove(self, ticker, vs_currency='usd'):
+        shutil.rmtree(self._dir(ticker, vs_currency), ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+_history_cache = None
+
+
+def getHistoryCache():
+    """Cache used by geckoHistorical(), None (default) when caching is disabled"""
+    return _history_cache
+
+
+def setHistoryCache(cache):
+    """Set the cache used by geckoHistorical()
+
+    Args:
+        cache (HistoryCache): ie HistoryCache('~/.cache/defi', max_age=3600), None disables caching
+    """
+    global _history_cache
+    _history_cache = cache
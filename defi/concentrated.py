@@ -0,0 +1,108 @@
+"""Impermanent loss for concentrated liquidity (v3 style ranged) positions
+
+Prices are the pair price (base token in quote token units) relative to the price when
+the position was opened, so a range lower=0.8, upper=1.25 is -20%/+25% around the entry
+price. All functions broadcast their array arguments, ie many ranges (shape R x 1)
+against many price changes (shape 1 x N) in a single pass.
+"""
+import numpy as np
+
+from .defi_tools import _pcs_index
+
+
+def _amounts(price_ratio, lower, upper):
+    """token amounts per unit of liquidity, base & quote, for a relative pair price"""
+    sqrt_l, sqrt_u = np.sqrt(lower), np.sqrt(upper)
+    sqrt_p = np.clip(np.sqrt(price_ratio), sqrt_l, sqrt_u)
+    return 1 / sqrt_p - 1 / sqrt_u, sqrt_p - sqrt_l
+
+
+def iloss_range(price_ratio, lower=0, upper=np.inf):
+    """Impermanent loss of a concentrated liquidity position compared with buy&hold of the deposited tokens
+
+    Args:
+        price_ratio (array_like): Variation A Asset / Variation B Asset, as in iloss()
+        lower (array_like, optional): range lower bound as ratio of entry price, ie 0.8. Default 0 (full range)
+        upper (array_like, optional): range upper bound as ratio of entry price, ie 1.25. Default inf (full range)
+
+    Returns:
+        ndarray: impermanent loss as decimal values, ie -0.05 for -5%
+    """
+    price_ratio = np.asarray(price_ratio, dtype=float)
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    x0, y0 = _amounts(1.0, lower, upper)
+    x, y = _amounts(price_ratio, lower, upper)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (x * price_ratio + y) / (x0 * price_ratio + y0) - 1
+
+
+def range_position(px_base, px_quote, lower, upper, value=100, base_pct_chg=0, quote_pct_chg=0):
+    """Value, impermanent loss and token composition of concentrated liquidity positions
+
+    Args:
+        px_base (float): current USD price of pair first token
+        px_quote (float): current USD price of pair second token
+        lower (array_like): range lower bound as ratio of current pair price, ie 0.8 (for -20%)
+        upper (array_like): range upper bound as ratio of current pair price, ie 1.25 (for +25%)
+        value (array_like, optional): USD value invested in LP default=100
+        base_pct_chg (array_like, optional): assumed change of first token price, ie 10 (for +10% change)
+        quote_pct_chg (array_like, optional): assumed change of second token price, ie -30 (for -30% change)
+
+    Returns:
+        dict of ndarrays (broadcasted shape of the inputs):
+            'amount_base_0', 'amount_quote_0': tokens deposited
+            'amount_base', 'amount_quote': tokens in the position after the price change
+            'base_share': share of final position value in first token
+            'in_range': True if the final price is inside the range
+            'value_f': final USD value, 'hold_f': final USD value holding the deposited tokens
+            'iloss': impermanent loss, value_f / hold_f - 1
+            'capital_efficiency': liquidity compared with a full range position of same value
+    """
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    value = np.asarray(value, dtype=float)
+    chg_base = 1 + np.asarray(base_pct_chg, dtype=float) / 100
+    chg_quote = 1 + np.asarray(quote_pct_chg, dtype=float) / 100
+    price_ratio = chg_base / chg_quote
+
+    # liquidity units: value in quote tokens at entry (relative price 1) divided by value per unit
+    x0, y0 = _amounts(1.0, lower, upper)
+    liquidity = value / px_quote / (x0 + y0)
+    x, y = _amounts(price_ratio, lower, upper)
+
+    px_base_f, px_quote_f = px_base * chg_base, px_quote * chg_quote
+    pair_px = px_base / px_quote
+    amount_base_0, amount_quote_0 = liquidity * x0 / pair_px, liquidity * y0
+    amount_base, amount_quote = liquidity * x / pair_px, liquidity * y
+    value_f = amount_base * px_base_f + amount_quote * px_quote_f
+    hold_f = amount_base_0 * px_base_f + amount_quote_0 * px_quote_f
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {'amount_base_0': amount_base_0, 'amount_quote_0': amount_quote_0,
+                'amount_base': amount_base, 'amount_quote': amount_quote,
+                'base_share': amount_base * px_base_f / value_f,
+                'in_range': (price_ratio >= lower) & (price_ratio <= upper),
+                'value_f': value_f, 'hold_f': hold_f, 'iloss': value_f / hold_f - 1,
+                'capital_efficiency': 2 / (x0 + y0) + np.zeros_like(value_f)}
+
+
+def range_simulate(base_token, quote_token, lower, upper, value=100, base_pct_chg=0, quote_pct_chg=0):
+    """Simulate concentrated liquidity positions with real time prices from pancakeswap API
+        Same inputs as iloss_simulate() plus the range bounds, without plotting
+
+    Args:
+        base_token (string): Pair first token, ie CAKE
+        quote_token (string): Pais second token, ie BNB
+        lower (array_like): range lower bound as ratio of current pair price, ie 0.8 (for -20%)
+        upper (array_like): range upper bound as ratio of current pair price, ie 1.25 (for +25%)
+        value (int, optional): Value investen in LP default=100
+        base_pct_chg (array_like, optional): assumed change of first token price, ie 10 (for +10% change)
+        quote_pct_chg (array_like, optional): assumed change of second token price, ie -30 (for -30% change)
+
+    Returns:
+        dict: range_position() results, plus 'px_base' and 'px_quote' current prices
+    """
+    px_base = float(_pcs_index.token(base_token)['price'])
+    px_quote = float(_pcs_index.token(quote_token)['price'])
+    res = range_position(px_base, px_quote, lower, upper, value, base_pct_chg, quote_pct_chg)
+    res.update({'px_base': px_base, 'px_quote': px_quote})
+    return res
@@ -1,16 +1,21 @@
 """Tools for use in DeFi
 """
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-import datetime, requests
-from scipy import interpolate
-import matplotlib.cm as cm
-from matplotlib.gridspec import GridSpec
+import datetime, json, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
 
+from .cache import getHistoryCache
+from .metrics import span
+from .transport import RateLimiter, getTransport
 
-from pandas.plotting import register_matplotlib_converters
-register_matplotlib_converters()
+
+def _pyplot():
+    """matplotlib is imported on first plot only, so the math & fetch functions don't pay its import time"""
+    import matplotlib.pyplot as plt
+    from pandas.plotting import register_matplotlib_converters
+    register_matplotlib_converters()
+    return plt
 
 
 def iloss(price_ratio, numerical=False):
@@ -30,12 +35,47 @@ def iloss(price_ratio, numerical=False):
     Returns:
         TYPE: impermanent loss as a string percentual value
     """
-    il = 2 * (price_ratio**0.5 / (1 + price_ratio)) - 1
+    il = _iloss(price_ratio)
     r = f"{il:.2%}" if not numerical else il
 
     return r
 
 
+def _iloss(price_ratio):
+    """impermanent loss formula for constant product pools, works on floats and numpy arrays"""
+    return 2 * (price_ratio**0.5 / (1 + price_ratio)) - 1
+
+
+def _pct_str(values):
+    """format a numeric array as percentual strings, ie 0.05 => "5.00%" """
+    return np.vectorize(lambda v: f"{v:.2%}", otypes=[object])(values)
+
+
+def iloss_array(price_ratio=None, var_A=None, var_B=None, as_str=False):
+    """Vectorized impermanent loss for many scenarios at once
+
+    Either price_ratio, or var_A and var_B, must be given. Inputs can be floats,
+    lists, numpy arrays or pandas Series and are broadcasted together.
+
+    Args:
+        price_ratio (array_like, optional): Variation A Asset / Variation B Asset
+        var_A (array_like, optional): Asset A % variation, ie 10 for 10%
+        var_B (array_like, optional): Asset B % variation, ie 10 for 10%
+        as_str (bool, optional): if True, returns percentual strings like iloss() (Default: False)
+
+    Returns:
+        ndarray: impermanent loss as decimal values, ie 0.05 for 5%
+    """
+    if price_ratio is None:
+        if var_A is None or var_B is None:
+            raise ValueError('must input price_ratio or both var_A and var_B')
+        var_A, var_B = np.asarray(var_A, dtype=float), np.asarray(var_B, dtype=float)
+        price_ratio = (var_A/100 + 1) / (var_B/100 + 1)
+
+    il = _iloss(np.asarray(price_ratio, dtype=float))
+    return _pct_str(il) if as_str else il
+
+
 
 def compare(days, var_A=0, var_B=0, rw_pool_A=0, rw_pool_B=0, rw_pool_AB=0, fees_AB=0):
     """Compare for 2 assets, buy&hold strategy with separate staking and farming by liquidity pool providing.
@@ -58,7 +98,7 @@ def compare(days, var_A=0, var_B=0, rw_pool_A=0, rw_pool_B=0, rw_pool_AB=0, fees
     """
     buy_hold = (0.5 * var_A + 0.5 * var_B)/100
     x = (var_A/100 + 1) / (var_B/100 + 1)
-    perdida_impermanente = 2 * (x**0.5 / (1 + x)) - 1
+    perdida_impermanente = _iloss(x)
 
     stake = buy_hold + 0.5 * days * (rw_pool_A/100 + rw_pool_B/100)
     farm = buy_hold * (1+perdida_impermanente) + days * (rw_pool_AB/100 + fees_AB/100)
@@ -68,6 +108,127 @@ def compare(days, var_A=0, var_B=0, rw_pool_A=0, rw_pool_B=0, rw_pool_AB=0, fees
 
 
 
+def _compare(days, var_A, var_B, rw_pool_A, rw_pool_B, rw_pool_AB, fees_AB):
+    """buy_hold, stake & farm decimal returns of compare(), works on floats and numpy arrays"""
+    buy_hold = (0.5 * var_A + 0.5 * var_B)/100
+    x = (var_A/100 + 1) / (var_B/100 + 1)
+    il = _iloss(x)
+
+    stake = buy_hold + 0.5 * days * (rw_pool_A/100 + rw_pool_B/100)
+    farm = buy_hold * (1+il) + days * (rw_pool_AB/100 + fees_AB/100)
+    return buy_hold, stake, farm
+
+
+def compare_array(days, var_A=0, var_B=0, rw_pool_A=0, rw_pool_B=0, rw_pool_AB=0, fees_AB=0,
+                  as_df=True, as_str=False):
+    """Vectorized version of compare() for many scenarios at once
+        All arguments can be floats, lists, numpy arrays or pandas Series and are broadcasted together
+
+    Args:
+        days (array_like): days for strategy
+        var_A (array_like, optional): Percentual variation for A token. Ex 10 for 10%
+        var_B (array_like, optional): Percentual variation for B token. Ex 10 for 10%
+        rw_pool_A (array_like, optional): Percentual rewards per day for one asset pool (Token A)
+        rw_pool_B (array_like, optional): Percentual rewards per day for one asset pool (Token B)
+        rw_pool_AB (array_like, optional): Percentual rewards per day for two asset farm (LP Token AB)
+        fees_AB (array_like, optional): Percentual provider liquidity fees earned per day
+        as_df (bool, optional): if True (default), return a DataFrame (only for 0-d/1-d scenarios),
+            else a numpy structured array with the broadcasted shape
+        as_str (bool, optional): if True, returns percentual strings like compare() (Default: False)
+
+    Returns:
+        DataFrame or structured ndarray: columns buy_hold, stake, farm (decimal returns) and Best
+    """
+    args = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in
+                                 (days, var_A, var_B, rw_pool_A, rw_pool_B, rw_pool_AB, fees_AB)])
+    buy_hold, stake, farm = _compare(*args)
+    best = np.where(farm > stake, 'Farm', 'Stake')
+
+    values = {'buy_hold': buy_hold, 'stake': stake, 'farm': farm}
+    if as_str:
+        values = {k: _pct_str(v) for k, v in values.items()}
+    values['Best'] = best
+
+    if as_df and buy_hold.ndim <= 1:
+        return pd.DataFrame({k: np.atleast_1d(v) for k, v in values.items()})
+
+    num = object if as_str else float
+    dtype = [('buy_hold', num), ('stake', num), ('farm', num), ('Best', 'U5')]
+    res = np.empty(buy_hold.shape, dtype=dtype)
+    for k, v in values.items():
+        res[k] = v
+    return res
+
+
+def iloss_inverse(il, var_B=None):
+    """Price ratios that produce a given impermanent loss, inverse of iloss()
+        Each loss happens for two price ratios, one the inverse of the other (A falls or rises vs B)
+
+    Args:
+        il (array_like): impermanent loss as decimal values between -1 and 0, ie -0.05 for -5%
+        var_B (array_like, optional): Asset B % variation, if given returns Asset A % variations instead of ratios
+
+    Returns:
+        tuple (ndarray, ndarray): (down, up) price ratios Variation A Asset / Variation B Asset, down <= 1 <= up.
+            NaN where il is out of range
+    """
+    y = 1 + np.asarray(il, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.where((y >= 0) & (y <= 1), y, np.nan)
+        root = np.sqrt(1 - y**2)
+        down = ((1 - root) / y)**2
+        up = ((1 + root) / y)**2
+    down, up = np.where(y == 0, 0.0, down), np.where(y == 0, np.inf, up)
+    if var_B is None:
+        return down, up
+    chg_B = np.asarray(var_B, dtype=float)/100 + 1
+    return (down * chg_B - 1) * 100, (up * chg_B - 1) * 100
+
+
+def compare_breakeven(days=None, var_A=0, var_B=0, rw_pool_A=0, rw_pool_B=0, rw_pool_AB=0, fees_AB=0,
+                      solve='rw_pool_AB'):
+    """Value of one compare() input at which Farm and Stake returns are equal
+        Closed form, all arguments are broadcasted together like compare_array()
+
+    Args:
+        days (array_like, optional): days for strategy, not needed if solve="days"
+        var_A (array_like, optional): Percentual variation for A token. Ex 10 for 10%
+        var_B (array_like, optional): Percentual variation for B token. Ex 10 for 10%
+        rw_pool_A (array_like, optional): Percentual rewards per day for one asset pool (Token A)
+        rw_pool_B (array_like, optional): Percentual rewards per day for one asset pool (Token B)
+        rw_pool_AB (array_like, optional): Percentual rewards per day for two asset farm (LP Token AB)
+        fees_AB (array_like, optional): Percentual provider liquidity fees earned per day
+        solve (str, optional): input to solve, "rw_pool_AB" (default), "fees_AB" or "days".
+            Its own argument is ignored
+
+    Returns:
+        ndarray: breakeven value, Farm is best above it (for days, only if farm daily rewards are
+            higher than staking ones). For days, NaN if returns never cross
+
+    Raises:
+        ValueError: if solve is not valid, or days is missing for solve="rw_pool_AB" or "fees_AB"
+    """
+    if solve not in ('rw_pool_AB', 'fees_AB', 'days'):
+        raise ValueError(f'solve must be "rw_pool_AB", "fees_AB" or "days", not {solve!r}')
+    if days is None and solve != 'days':
+        raise ValueError(f'days is required to solve {solve}')
+    var_A, var_B = np.asarray(var_A, dtype=float), np.asarray(var_B, dtype=float)
+    buy_hold = (0.5 * var_A + 0.5 * var_B)/100
+    # price term of farm - stake, in percent
+    price = 100 * buy_hold * _iloss((var_A/100 + 1) / (var_B/100 + 1))
+    stake_rw = 0.5 * (np.asarray(rw_pool_A, dtype=float) + np.asarray(rw_pool_B, dtype=float))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if solve == 'rw_pool_AB':
+            return stake_rw - np.asarray(fees_AB, dtype=float) - price / np.asarray(days, dtype=float)
+        if solve == 'fees_AB':
+            return stake_rw - np.asarray(rw_pool_AB, dtype=float) - price / np.asarray(days, dtype=float)
+        if solve == 'days':
+            res = -price / (np.asarray(rw_pool_AB, dtype=float) + np.asarray(fees_AB, dtype=float) - stake_rw)
+            return np.where(res >= 0, res, np.nan)
+
+
+
 
 
 ######################################################################
@@ -78,54 +239,103 @@ def compare(days, var_A=0, var_B=0, rw_pool_A=0, rw_pool_B=0, rw_pool_AB=0, fees
 ######################################################################
 
 
-def getProtocols():
+def _compactColumn(s):
+    """column with strings as categoricals and numbers downcasted (floats to float32)"""
+    if s.dtype.kind == 'O' and pd.api.types.infer_dtype(s, skipna=True) in ('string', 'empty'):
+        return s.astype('category')
+    if s.dtype.kind == 'f':
+        return s.astype(np.float32)
+    if s.dtype.kind in 'iu':
+        return pd.to_numeric(s, downcast='integer')
+    return s
+
+
+def _tvlHistory(items, compact=False):
+    """date indexed TVL DataFrame, parsed into preallocated numpy arrays"""
+    n = len(items)
+    dates = np.fromiter((int(i['date']) for i in items), dtype=np.int64, count=n)
+    tvl = np.fromiter((i['totalLiquidityUSD'] for i in items), dtype=np.float32 if compact else np.float64, count=n)
+    index = pd.DatetimeIndex(pd.to_datetime(dates, unit='s'), name='date')
+    return pd.DataFrame({'totalLiquidityUSD': tvl}, index=index)
+
+
+def getProtocols(columns=None, compact=False):
     """Get list all DeFi protocols across all blockchains
     
+    Args:
+        columns (list, optional): only keep these fields, ie ['tvl', 'category', 'chains'] (default all).
+            Other fields (nested lists & dicts too) are dropped before building the DataFrame
+        compact (bool, optional): if True, repeated strings (category, chain, symbol...) are stored as
+            categoricals and numbers downcasted. TVL as float32 keeps ~7 significant digits,
+            so values above ~1e7 lose precision (ie 12345678.9 -> 12345679)
+
     Returns:
         DataFrame: All DeFi dApps 
     """
     url = "https://api.llama.fi/protocols"
-    r = requests.get(url)
-    r_json = r.json()
-    df = pd.DataFrame(r_json)
+    return _protocolsFrame(getTransport().get_json(url), columns, compact)
+
+
+def _protocolsFrame(r_json, columns=None, compact=False):
+    """getProtocols() DataFrame from the decoded json, only with the given columns"""
+    if columns is not None:
+        columns = list(dict.fromkeys(['name', *columns]))
+    df = pd.DataFrame(r_json, columns=columns)
+    if compact:
+        df = df.apply(_compactColumn)
+        df['name'] = df['name'].astype(object)
     df.set_index('name', inplace=True)
     return df
 
 
-def getProtocol(protocol):
+def getProtocol(protocol, fields=None, compact=False):
     """Get metrics and historic TVL for one DeFi dApp
     
     Args:
         protocol (String): Name of protocol ie "Uniswap"
+        fields (list, optional): metadata fields to keep, ie ['name', 'category'] (default all)
+        compact (bool, optional): if True, TVL history is stored as float32, losing precision above ~1e7
     
     Returns:
         tuple (Dictionary, DataFrame): Dictionary with protocol metadata & DataFrame with historical TVL
     """
     url = f"https://api.llama.fi/protocol/{protocol}"
-    r = requests.get(url)
-    r_json = r.json()
+    return _protocolFrame(getTransport().get_json(url), fields, compact)
 
-    df = pd.DataFrame(r_json['tvl'])
-    df.date = pd.to_datetime(df.date, unit='s')
-    df = df.set_index('date')
-    del r_json['tvl']
-    metadata = r_json
+
+def _protocolFrame(r_json, fields=None, compact=False):
+    """getProtocol() results from the decoded json"""
+    if compact:
+        df = _tvlHistory(r_json.pop('tvl'), compact)
+    else:
+        df = pd.DataFrame(r_json.pop('tvl'))
+        df.date = pd.to_datetime(df.date, unit='s')
+        df = df.set_index('date')
+    metadata = r_json if fields is None else {key: value for key, value in r_json.items() if key in fields}
 
     return metadata, df
 
 
-def getChart():
+def getChart(compact=False):
     """Get historical TVL across all DeFi dApps, cummulative result
     
+    Args:
+        compact (bool, optional): if True, TVL is stored as float32, losing precision above ~1e7
+
     Returns:
         DataFrame: DataFrame date-indexed with all days TVL 
     """
 
     url  = "https://api.llama.fi/charts"
-    r = requests.get(url)
-    r_json = r.json()
+    return _chartFrame(getTransport().get_json(url), compact)
+
+
+def _chartFrame(r_json, compact=False):
+    if compact:
+        return _tvlHistory(r_json, compact)
+
     df = pd.DataFrame(r_json)
-    df.date = pd.to_datetime(df.date, unit='s')
+    df.date = pd.to_datetime(df.date.astype('int64'), unit='s')
     df = df.set_index('date')
     return df
 
@@ -141,6 +351,11 @@ def getChart():
 
 
 
+def _geckoRateLimiter():
+    """default limit for concurrent coinGecko downloads, 30 calls per minute"""
+    return RateLimiter(rate=0.5, burst=5)
+
+
 def geckoPrice(tokens, quote):
     """get price of combine pairs
     
@@ -154,7 +369,7 @@ def geckoPrice(tokens, quote):
 
     url = "https://api.coingecko.com/api/v3/simple/price"
     params = {"ids":tokens, "vs_currencies":quote}
-    r = requests.get(url, params).json()
+    r = getTransport().get_json(url, params)
     return r
 
 
@@ -171,56 +386,187 @@ def geckoList(page=1, per_page=250):
     """
     url = "https://api.coingecko.com/api/v3/coins/markets"
     params = {"vs_currency":"usd", "order":"market_cap_desc", "per_page":per_page, "page":page}
-    r = requests.get(url, params).json()
+    return _geckoListFrame(getTransport().get_json(url, params))
+
+
+def _geckoListFrame(r):
     df = pd.DataFrame(r)
     df.set_index('symbol', inplace=True)
     return df
 
 
 
-def geckoMarkets(ticker):
+def _geckoTickersFrame(tickers):
+    """markets DataFrame from coinGecko tickers, nested fields extracted in one pass"""
+    market = [t.get('market') or {} for t in tickers]
+    converted_volume = [t.get('converted_volume') or {} for t in tickers]
+    converted_last = [t.get('converted_last') or {} for t in tickers]
+    df = pd.DataFrame({
+        'base': [t.get('base') for t in tickers],
+        'target': [t.get('target') for t in tickers],
+        'last': np.array([t.get('last') for t in tickers], dtype=float),
+        'volume': np.array([t.get('volume') for t in tickers], dtype=float),
+        'spread': np.array([t.get('bid_ask_spread_percentage') for t in tickers], dtype=float),
+        'timestamp': pd.to_datetime([t.get('timestamp') for t in tickers]),
+        'volume_usd': np.array([v.get('usd') for v in converted_volume], dtype=float),
+        'price_usd': np.array([v.get('usd') for v in converted_last], dtype=float),
+        'trust_score': [t.get('trust_score') for t in tickers],
+    }, index=pd.Index([m.get('name') for m in market], name='exchange'))
+    return df
+
+
+def geckoMarkets(ticker, pages=1):
     """Get top100 markets (pairs, quotes, exchanges, volume, spreads and more)
     
     Args:
         ticker (string): gecko ID, ie "bitcoin"
+        pages (int, optional): pages of 100 markets to download, default 1. None follows all pages
     
     Returns:
         DataFrame: Full detail markets available
     """
     url = f"https://api.coingecko.com/api/v3/coins/{ticker}/tickers"
-    r = requests.get(url).json()['tickers']
-    df = pd.DataFrame(r)
-    df['exchange'] = df['market'].apply(pd.Series)['name']
-    df['volume_usd'] = df['converted_volume'].apply(pd.Series)['usd']
-    df['price_usd'] = df['converted_last'].apply(pd.Series)['usd']
-
-    df.set_index('exchange', inplace=True)
-    cols = ['base','target','last', 'volume','bid_ask_spread_percentage','timestamp',
-                   'volume_usd','price_usd','trust_score']
-    df = df.loc[:,cols]
-    cols[4] = 'spread'
-    df.columns = cols
-    df.timestamp = pd.to_datetime(df.timestamp)
-    
+    tickers, page = [], 1
+    while pages is None or page <= pages:
+        r = getTransport().get_json(url, {'page': page} if page > 1 else None)['tickers']
+        tickers.extend(r)
+        if len(r) < 100:
+            break
+        page += 1
+
+    df = _geckoTickersFrame(tickers)
     return df.sort_values('volume_usd', ascending=False)
 
 
+def geckoMarketsBatch(tickers, pages=None, max_workers=4, rate_limit=None):
+    """Markets for many coins, downloaded concurrently
+    
+    Args:
+        tickers (list): gecko IDs, ie ["bitcoin", "ethereum"]
+        pages (int, optional): max pages of 100 markets for each coin, None (default) follows all pages
+        max_workers (int, optional): max concurrent requests, default 4
+        rate_limit (RateLimiter, optional): limiter shared by all requests, default 30 calls per minute
+    
+    Returns:
+        DataFrame: Full detail markets indexed by (coin, exchange). Coins that failed are left out,
+            with their error message in df.attrs['errors']
+    """
+    rate_limit = _geckoRateLimiter() if rate_limit is None else rate_limit
+    url = "https://api.coingecko.com/api/v3/coins/{}/tickers"
+
+    def fetch(args):
+        coin, page = args
+        rate_limit.acquire()
+        try:
+            return getTransport().get_json(url.format(coin), {'page': page} if page > 1 else None)['tickers'], None
+        except Exception as e:
+            return None, f'{type(e).__name__}: {e}'
+
+    results = {coin: [] for coin in tickers}
+    errors = {}
+    pending = [(coin, 1) for coin in tickers]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending:
+            next_pages = []
+            for (coin, page), (r, err) in zip(pending, pool.map(fetch, pending)):
+                if err is not None:
+                    errors[coin] = err
+                    continue
+                results[coin].extend(r)
+                if len(r) == 100 and (pages is None or page < pages):
+                    next_pages.append((coin, page + 1))
+            pending = next_pages
+
+    return _geckoMarketsFrame(results, errors)
+
+
+def _geckoMarketsFrame(results, errors):
+    """geckoMarketsBatch() DataFrame from {coin: tickers}, leaving out coins with errors"""
+    frames = {coin: _geckoTickersFrame(r) for coin, r in results.items() if coin not in errors}
+    df = pd.concat(frames or {None: _geckoTickersFrame([])}, names=['coin', 'exchange'])
+    df = df.sort_values(['coin', 'volume_usd'], ascending=[True, False], kind='stable')
+    df.attrs['errors'] = errors
+    return df
+
+
 
-def geckoHistorical(ticker, vs_currency='usd', days='max'):
+def geckoHistorical(ticker, vs_currency='usd', days='max', cache=None):
     """Historical prices from coinGecko
     
     Args:
         ticker (string): gecko ID, ie "bitcoin"
         vs_currency (str, optional): ie "usd" (default)
         days (str, optional): ie "20", "max" (default)
+        cache (HistoryCache, optional): cache for full histories (days="max"), only the missing
+            tail is downloaded when stale. Default is the cache set with defi.cache.setHistoryCache()
     
     Returns:
         DataFrame: Full history: date, price, market cap & volume
     """
+    return _geckoHistory(f"coins/{ticker}", ticker, vs_currency, days, cache)
+
+
+def geckoHistoricalContract(address, platform='binance-smart-chain', vs_currency='usd', days='max', cache=None):
+    """Historical prices from coinGecko for a token contract address, ie a pancakeswap token
     
-    url = f"https://api.coingecko.com/api/v3/coins/{ticker}/market_chart"
-    params = {"vs_currency":{vs_currency}, "days":days}
-    r = requests.get(url, params).json()
+    Args:
+        address (string): token contract address
+        platform (str, optional): coinGecko asset platform, "binance-smart-chain" (default), "ethereum"...
+        vs_currency (str, optional): ie "usd" (default)
+        days (str, optional): ie "20", "max" (default)
+        cache (HistoryCache, optional): same as geckoHistorical(), cached with key "platform_address"
+    
+    Returns:
+        DataFrame: Full history: date, price, market cap & volume
+    """
+    address = address.lower()
+    return _geckoHistory(f"coins/{platform}/contract/{address}", f"{platform}_{address}", vs_currency, days, cache)
+
+
+def _geckoHistory(path, key, vs_currency, days, cache, transport=None):
+    cache = getHistoryCache() if cache is None else cache
+    if cache is None or days != 'max':
+        return _geckoChart(path, vs_currency, days, transport=transport)
+
+    with span('cache', key=key) as s:
+        cached, fetched_at = cache.load(key, vs_currency)
+        if cached is not None and cache.is_fresh(fetched_at):
+            s.set(cache='hit')
+            return cached
+
+        if cached is None or cached.empty:
+            s.set(cache='miss')
+            df = _geckoChart(path, vs_currency, days, transport=transport)
+        else:
+            s.set(cache='partial')
+            tail_days = (pd.Timestamp.now('UTC').tz_localize(None) - cached.index[-1]).days + 2
+            tail = _geckoChart(path, vs_currency, tail_days, interval='daily', transport=transport)
+            df = _mergeTail(cached, tail)
+
+        cache.save(key, vs_currency, df)
+        return df
+
+
+def _mergeTail(cached, tail):
+    """cached history with its last days replaced by a fresh daily tail, cached if the tail is empty"""
+    if tail.empty:
+        return cached
+    return pd.concat([cached.loc[cached.index < tail.index[0].normalize()], tail])
+
+
+def _geckoChart(path, vs_currency, days, interval=None, transport=None):
+    url = f"https://api.coingecko.com/api/v3/{path}/market_chart"
+    params = {"vs_currency":vs_currency, "days":days}
+    if interval:
+        params['interval'] = interval
+    transport = getTransport() if transport is None else transport
+    return _geckoChartFrame(transport.get_json(url, params))
+
+
+def _geckoChartFrame(r):
+    if not r['prices']:
+        return pd.DataFrame(columns=['price','market_caps','total_volumes'], dtype=float,
+                            index=pd.DatetimeIndex([], dtype='datetime64[ns]', name='date'))
     prices = pd.DataFrame(r['prices'])
     market_caps = pd.DataFrame(r['market_caps'])
     total_volumes = pd.DataFrame(r['total_volumes'])
@@ -232,18 +578,51 @@ def geckoHistorical(ticker, vs_currency='usd', days='max'):
     return df
 
 
-def getGeckoIDs():
+def geckoListPages(pages=20, per_page=250, max_workers=4, rate_limit=None, progress=None):
+    """Full detail conGecko currency list for many pages, downloaded concurrently
+    
+    Args:
+        pages (int, optional): number of pages, default 20
+        per_page (int, optional): number of records per page, default 250
+        max_workers (int, optional): max concurrent requests, default 4
+        rate_limit (RateLimiter, optional): limiter shared by all requests, default 30 calls per minute
+        progress (callable, optional): called as progress(pages_done, pages) after each page
+    
+    Returns:
+        DataFrame: list of full detail conGecko currency list, ordered by page
+    """
+    rate_limit = _geckoRateLimiter() if rate_limit is None else rate_limit
+    done = [0]
+    lock = threading.Lock()
+
+    def fetch(page):
+        rate_limit.acquire()
+        df = geckoList(page=page, per_page=per_page)
+        if progress is not None:
+            with lock:
+                done[0] += 1
+                progress(done[0], pages)
+        return df
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        frames = list(pool.map(fetch, range(1, pages + 1)))
+
+    return pd.concat(frames)
+
+
+def getGeckoIDs(pages=20, per_page=250, progress=None, **kwargs):
     """IDs List from coinGecko
     
+    Args:
+        pages (int, optional): number of pages, default 20
+        per_page (int, optional): number of records per page, default 250
+        progress (callable, optional): called as progress(pages_done, pages) after each page
+        **kwargs: max_workers & rate_limit, passed to geckoListPages()
+
     Returns:
-        list: First 5000 coingecko IDs by marketCap rank
+        list: First 5000 (pages * per_page) coingecko IDs by marketCap rank
     """    
-    ids_list = []
-
-    for i in range(20):
-        print(f'searching coins page: {i}   ', end='\r')
-        ids_list = ids_list + geckoList(page=i, per_page=250)['id'].tolist()
-    return ids_list
+    return geckoListPages(pages, per_page, progress=progress, **kwargs)['id'].tolist()
 
 
 
@@ -257,94 +636,77 @@ def farmSimulate(pair, apr, start='2021-01-01'):
         start (str, optional): ISO Format YYYY-MM-DD ie "2021-01-01", "2021-01-01" (default)
     
     Returns:
-        Dict & Plot: Full farming strategy results
+        Dict & Plot: Full farming strategy results, or {'error', 'errors': {coin: download error}} if
+            a history could not be downloaded
     """
 
-    prices = pd.DataFrame()
-    for coin in pair:
-        print(f'Downloading {coin}')
-        try:
-            df = geckoHistorical(coin)
-            prices[coin] = df['price']
-        except:
-            print(f'Error geting {coin} prices')
+    history, errors = {}, {}
+    with span('farmSimulate.download'):
+        for coin in pair:
+            print(f'Downloading {coin}')
+            try:
+                history[coin] = geckoHistorical(coin)['price']
+            except Exception as e:
+                errors[coin] = f'{type(e).__name__}: {e}'
+    prices = pd.concat(history, axis=1, sort=True) if history else pd.DataFrame()
 
     if len(prices.columns)==2:
-        prices = prices.dropna().iloc[:]
-        start = datetime.datetime.strptime(start, '%Y-%m-%d')  
-        farm = prices.loc[prices.index>=start]
-        farm = farm.divide(farm.iloc[0])
-        farm['ratio'] = farm.iloc[:,1].divide(farm.iloc[:,0])
-
-
-        farm['iloss'] = 2 * (farm['ratio']**0.5 / (1 + farm['ratio'])) - 1
-        farm['rewards'] = pd.Series(1*apr/100/365, index=farm.index).cumsum()
-        farm['buy_hold'] = (farm.iloc[:,0] + farm.iloc[:,1])/2 
-        farm['farm'] =  farm.buy_hold *(1+farm.iloss) * (1+farm.rewards) 
-
-
-        cagrs = farm.iloc[-1]**(1/(365/len(farm)))-1
-        sigmas = farm.pct_change().std() * 365**0.5
-        sharpes = cagrs.divide(sigmas).round(2)
-        dd = farm/farm.cummax()-1
-
-        fig = plt.figure(figsize=(15,8))
-        gs = GridSpec(nrows=2,ncols=4, figure=fig, height_ratios=[2,1], hspace=0.45, wspace=0.35, top=.9)
-        ax_upleft = fig.add_subplot(gs[0,0:2])
-        ax_upright = fig.add_subplot(gs[0,2:])
-        cols = 4
-        ax_down = [fig.add_subplot(gs[1,i]) for i in range(cols)]
-        
-        ax_upleft.plot(farm.iloss.abs(), label='Impermanent Loss')
-        ax_upleft.plot(farm.rewards, label='Farming Rewards')
-        ax_upleft.legend()
-        ax_upleft.grid()
-        ax_upleft.set_title('Impermanent Loss vs Farming Rewards')
-        ax_upleft.tick_params(axis='x', rotation=45)
-        
-        ax_upright.plot(farm.iloc[:,:2])
-        ax_upright.plot(farm.buy_hold)
-        ax_upright.plot(farm.farm)
-        ax_upright.grid()
-        ax_upright.legend([pair[0],pair[1],'Buy&Hold','Farming Strategy'])
-        ax_upright.set_title(f'{pair[0]} vs {pair[1]} vs Buy & Hold vs Farming strategy payoff')
-        ax_upright.tick_params(axis='x', rotation=45)
-        
-        cagrs[[pair[0],pair[1],'buy_hold','farm']].plot(kind='bar', ax=ax_down[0])
-        sigmas[[pair[0],pair[1],'buy_hold','farm']].plot(kind='bar', ax=ax_down[1])
-        sharpes[[pair[0],pair[1],'buy_hold','farm']].plot(kind='bar', ax=ax_down[2])
-        dd[[pair[0],pair[1],'buy_hold','farm']].min().plot(kind='bar', ax=ax_down[3])
-
-        ax_down[0].set_title('CAGR', fontsize=12)
-        ax_down[1].set_title('Anualized Volatility', fontsize=12)
-        ax_down[2].set_title('Sharpe Ratio', fontsize=12)
-        ax_down[3].set_title('Max DrawDowns', fontsize=12)
-        [ax_down[i].grid(alpha=0.4) for i in range(cols)]
-
-        for i in range(cols):
-            ax_down[i].spines['top'].set_visible(False)
-            ax_down[i].spines['right'].set_visible(False)
-
-        
-        b_h = (farm.iloc[-1].iloc[0] + farm.iloc[-1].iloc[1])/2 - 1
-        iloss = farm.iloc[-1].iloss
-        rewards = farm.iloc[-1].rewards
-        net_farming = b_h  * (1+iloss) * (1+rewards)
-
-        
-        result = {'Token 1': pair[0], 'Token 2': pair[1], 'start':start.isoformat()[:10], 
-                  'fixed APR': f'{apr/100:.0%}', 'Buy & Hold': f'{b_h:.2%}', 
-                  'Impermanent Loss':f'{iloss:.2%}', 'Farming Rewards': f'{rewards:.2%}', 
-                  'Farming + Rewards - IL': f'{net_farming:.2%}' }
+        with span('farmSimulate.compute'):
+            farm, cagrs, sigmas, sharpes, dd = _farmFrame(prices, apr, start)
+
+        with span('farmSimulate.plot'):
+            from .render import drawFarm
+            plt = _pyplot()
+            fig = plt.figure(figsize=(15,8))
+            drawFarm(fig, {'pair': pair, 'farm': farm, 'cagrs': cagrs, 'sigmas': sigmas, 
+                           'sharpes': sharpes, 'dd': dd})
+
+        result = _farmResult(pair, apr, start, farm)
 
         plt.show()
 
     else:
-        result = 'Error geting historical prices, see geckoIDs() function to get CoinGecko IDs'
+        result = {'error': 'Error geting historical prices, see geckoIDs() function to get CoinGecko IDs',
+                  'errors': errors}
     return result
 
 
 
+def _farmFrame(prices, apr, start):
+    """farmSimulate() daily strategy DataFrame & its cagr, volatility, sharpe and drawdown"""
+    prices = prices.dropna().iloc[:]
+    start = datetime.datetime.strptime(start, '%Y-%m-%d')  
+    farm = prices.loc[prices.index>=start]
+    farm = farm.divide(farm.iloc[0])
+    farm['ratio'] = farm.iloc[:,1].divide(farm.iloc[:,0])
+
+
+    farm['iloss'] = 2 * (farm['ratio']**0.5 / (1 + farm['ratio'])) - 1
+    farm['rewards'] = pd.Series(1*apr/100/365, index=farm.index).cumsum()
+    farm['buy_hold'] = (farm.iloc[:,0] + farm.iloc[:,1])/2 
+    farm['farm'] =  farm.buy_hold *(1+farm.iloss) * (1+farm.rewards) 
+
+
+    cagrs = farm.iloc[-1]**(365/len(farm))-1
+    sigmas = farm.pct_change().std() * 365**0.5
+    sharpes = cagrs.divide(sigmas).round(2)
+    dd = farm/farm.cummax()-1
+    return farm, cagrs, sigmas, sharpes, dd
+
+
+def _farmResult(pair, apr, start, farm):
+    """farmSimulate() results dict from the strategy DataFrame"""
+    b_h = (farm.iloc[-1].iloc[0] + farm.iloc[-1].iloc[1])/2 - 1
+    iloss = farm.iloc[-1].iloss
+    rewards = farm.iloc[-1].rewards
+    net_farming = b_h  * (1+iloss) * (1+rewards)
+
+    return {'Token 1': pair[0], 'Token 2': pair[1], 'start':start, 
+            'fixed APR': f'{apr/100:.0%}', 'Buy & Hold': f'{b_h:.2%}', 
+            'Impermanent Loss':f'{iloss:.2%}', 'Farming Rewards': f'{rewards:.2%}', 
+            'Farming + Rewards - IL': f'{net_farming:.2%}' }
+
+
 ######################################################################
 ##                                                                  ##
 ##       Pancake Swap API                                           ##
@@ -361,22 +723,65 @@ def toFloatPartial(df):
             pass
     return df
 
-        
-def pcsSummary(as_df = True ):
 
-    url = "https://api.pancakeswap.info/api/v2/summary"
-    r = requests.get(url).json()
-    data = r.get('data', None)
-    upd = r.get('updated_at')/1000
-    upd_dt = datetime.datetime.fromtimestamp(upd)
 
-    if as_df:
-        df = pd.DataFrame.from_dict(data, orient='index')
-        df = toFloatPartial(df) 
-        df['updated'] = upd_dt
-        return df
-    else:
+# columns types for each endpoint, columns not declared are kept as returned by the API
+PCS_SCHEMAS = {
+    'summary': {'float': ['price', 'base_volume', 'quote_volume', 'liquidity', 'liquidity_BNB'],
+                'category': []},
+    'tokens': {'float': ['price', 'price_BNB'],
+               'category': ['symbol']},
+    'pairs': {'float': ['price', 'base_volume', 'quote_volume', 'liquidity', 'liquidity_BNB'],
+              'category': ['base_symbol', 'base_address', 'quote_symbol', 'quote_address']},
+}
+
+
+def _pcsFrame(data, endpoint, updated):
+    """typed DataFrame from a pancakeswap payload, following PCS_SCHEMAS"""
+    schema = PCS_SCHEMAS[endpoint]
+    rows = list(data.values())
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    frame = {}
+    for col in columns:
+        values = [row.get(col) for row in rows]
+        if col in schema['float']:
+            try:
+                frame[col] = np.array(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                frame[col] = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy()
+        elif col in schema['category']:
+            frame[col] = pd.Categorical(values)
+        else:
+            frame[col] = values
+    df = pd.DataFrame(frame, index=list(data.keys()))
+    df['updated'] = updated
+    return df
+
+
+def _pcsGet(endpoint, as_df):
+    url = f"https://api.pancakeswap.info/api/v2/{endpoint}"
+    return _pcsParse(getTransport().get_json(url), endpoint, as_df)
+
+
+def _pcsParse(r, endpoint, as_df):
+    if not as_df:
         return r
+    data = r.get('data', None)
+    upd_dt = datetime.datetime.fromtimestamp(r.get('updated_at')/1000)
+    return _pcsFrame(data, endpoint, upd_dt)
+
+
+def pcsSummary(as_df = True ):
+    """get 24h volume, price and liquidity summary for all pancakeswap pairs
+    
+    Args:
+        as_df (bool, optional): if True (default), return is a dataframe, else is a dictionary
+    
+    Returns:
+        DataFrame with next columns: price  base_volume  quote_volume  liquidity  liquidity_BNB  updated
+    """
+    return _pcsGet('summary', as_df)
+
 
 def pcsTokens(as_df = True):
     """get all token listed in pancakeswap
@@ -389,20 +794,7 @@ def pcsTokens(as_df = True):
 
     """
     # ultimo precio y volumen de base/quote de todos los pares
-
-    url = "https://api.pancakeswap.info/api/v2/tokens"
-    r = requests.get(url).json()
-    data = r.get('data', None)
-    upd = r.get('updated_at')/1000
-    upd_dt = datetime.datetime.fromtimestamp(upd)
-    
-    if as_df:
-        df = pd.DataFrame.from_dict(data, orient='index')
-        df = toFloatPartial(df) 
-        df['updated'] = upd_dt
-        return df
-    else:
-        return r
+    return _pcsGet('tokens', as_df)
 
 
 def pcsPairs(as_df = True):
@@ -416,29 +808,92 @@ def pcsPairs(as_df = True):
        'quote_name', 'quote_symbol', 'quote_address', 'price', 'base_volume',
        'quote_volume', 'liquidity', 'liquidity_BNB', 'updated'
     """
+    return _pcsGet('pairs', as_df)
 
-    url = "https://api.pancakeswap.info/api/v2/pairs"
-    r = requests.get(url).json()
-    data = r.get('data', None)
-    upd = r.get('updated_at')/1000
-    upd_dt = datetime.datetime.fromtimestamp(upd)
+
+def pcsSnapshot():
+    """get summary, tokens and pairs from pancakeswap, downloaded concurrently
     
-    if as_df:
-        df = pd.DataFrame.from_dict(data, orient='index')
-        df = toFloatPartial(df) 
-        df['updated'] = upd_dt
-        return df
-    else:
-        return r
+    Returns:
+        Dict: {'summary': DataFrame, 'tokens': DataFrame, 'pairs': DataFrame,
+               'updated': datetime of the oldest of the three payloads, shared by all DataFrames}
+    """
+    endpoints = ['summary', 'tokens', 'pairs']
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as pool:
+        payloads = dict(zip(endpoints, pool.map(lambda e: _pcsGet(e, as_df=False), endpoints)))
 
-def pcsTokenInfo(search):
+    updated = datetime.datetime.fromtimestamp(min(r.get('updated_at') for r in payloads.values())/1000)
+    res = {e: _pcsFrame(payloads[e].get('data', None), e, updated) for e in endpoints}
+    res['updated'] = updated
+    return res
+
+
+def _pcsTokensIndex(data):
+    """token info keyed by upper case symbol and contract address"""
+    index = {}
+    for contract, values in data.items():
+        index.setdefault(values['symbol'].upper(), values)
+        index.setdefault(contract.upper(), values)
+    return index
+
+
+def _pcsPairsIndex(data):
+    """pair info keyed by the frozenset of upper case base & quote symbols"""
+    index = {}
+    for contract, values in data.items():
+        key = frozenset((values['base_symbol'].upper(), values['quote_symbol'].upper()))
+        index.setdefault(key, values)
+    return index
+
+
+class PcsIndex:
+    """PancakeSwap tokens & pairs snapshot with hash indexes for fast lookups
+        Each endpoint is downloaded at most once per ttl seconds, shared by all lookups
+
+    Args:
+        ttl (float, optional): seconds before refreshing tokens & pairs data, default 60
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._data = {}
+        self._locks = {'tokens': threading.Lock(), 'pairs': threading.Lock()}
+
+    def _index(self, endpoint, build):
+        with self._locks[endpoint]:
+            index, fetched_at = self._data.get(endpoint, (None, -float('inf')))
+            if time.monotonic() - fetched_at >= self.ttl:
+                index = build(_pcsGet(endpoint, as_df=False).get('data', None))
+                self._data[endpoint] = (index, time.monotonic())
+            return index
+
+    def token(self, search):
+        """token info by symbol or contract address (case insensitive), None if not found"""
+        search = 'WBNB' if search.upper() == 'BNB' else search
+        return self._index('tokens', _pcsTokensIndex).get(search.upper())
+
+    def pair(self, base, quote):
+        """pair info by base and quote symbols in any order (case insensitive), None if not found"""
+        base = 'WBNB' if base.upper() == 'BNB' else base
+        quote = 'WBNB' if quote.upper() == 'BNB' else quote
+        return self._index('pairs', _pcsPairsIndex).get(frozenset((base.upper(), quote.upper())))
+
+    def clear(self):
+        self._data.clear()
+
+
+_pcs_index = PcsIndex()
+
+
+def pcsTokenInfo(search, index=None):
     """get info from a token
     
     Args:
-        search (string): Token symbol or contract address
+        search (string or list): Token symbol or contract address, or a list of them
+        index (PcsIndex, optional): snapshot used for lookups, default is shared with a 60 seconds ttl
     
     Returns:
-        Dict: 
+        Dict (or list of Dicts for a list search): 
         {
          'name': 'Wrapped BNB',
          'symbol': 'WBNB',
@@ -446,29 +901,25 @@ def pcsTokenInfo(search):
          'price_BNB': '1'
          }
     """
-    search = 'WBNB' if search.upper() == 'BNB' else search   
-    url = "https://api.pancakeswap.info/api/v2/tokens"
-    r = requests.get(url).json()
-    data = r.get('data', None)
-    res = f"Not found: {search}"
-    for contract, values in data.items():
-        if search.upper() == values['symbol'].upper() or search.upper()==contract.upper():
-            res = data[contract]
-            break
+    index = _pcs_index if index is None else index
+    if not isinstance(search, str):
+        return [pcsTokenInfo(s, index) for s in search]
 
-    return res
+    res = index.token(search)
+    return f"Not found: {search}" if res is None else res
 
 
 
-def pcsPairInfo(base, quote):
+def pcsPairInfo(base, quote=None, index=None):
     """get info from a token pair LP
     
     Args:
-        base (string): Base LP token, ie "CAKE"
+        base (string or list): Base LP token, ie "CAKE", or a list of (base, quote) tuples
         quote (string): Quote LP token, ie "BNB"
         its the same if you call pcsPAirInfo('cake', 'bnb') or pcsPAirInfo('bnb', 'cake') 
+        index (PcsIndex, optional): snapshot used for lookups, default is shared with a 60 seconds ttl
     Returns:
-        Dict: {
+        Dict (or list of Dicts for a list of pairs): {
                  'pair_address': '0xA527a61703D82139F8a06Bc30097cC9CAA2df5A6',
                  'base_name': 'PancakeSwap Token',
                  'base_symbol': 'Cake',
@@ -484,32 +935,62 @@ def pcsPairInfo(base, quote):
                 }
                 * price is actually a ratio between base/quote tokens
     """
-    url = "https://api.pancakeswap.info/api/v2/pairs"
-    r = requests.get(url).json()
-    data = r.get('data', None)
-    res = f"Not found: {base}-{quote}"
-    base = 'WBNB' if base.upper() == 'BNB' else base
-    quote = 'WBNB' if quote.upper() == 'BNB' else quote
-    
-    for contract, values in data.items():
-        base_ = base.upper() == values['base_symbol'].upper()
-        quote_ = quote.upper() == values['quote_symbol'].upper()
-        base_cross = base.upper() == values['quote_symbol'].upper()
-        quote_cross = quote.upper() == values['base_symbol'].upper()
+    index = _pcs_index if index is None else index
+    if quote is None:
+        return [pcsPairInfo(b, q, index) for b, q in base]
 
-        if  (base_ and quote_) or  (base_cross and quote_cross):
-            res = data[contract]
-            break
-            
-    return res
+    res = index.pair(base, quote)
+    return f"Not found: {base}-{quote}" if res is None else res
+
+
+def iloss_surface(px_base, px_quote, value=100, base_pct_chg=0, quote_pct_chg=0, grid_size=300, pct_range=(1, 300)):
+    """Compute the impermanent loss surface for a LP pair without plotting
+        The surface is closed form on a regular grid of price multipliers, no interpolation needed
+
+    Args:
+        px_base (float): current price of pair first token
+        px_quote (float): current price of pair second token
+        value (int, optional): Value investen in LP default=100
+        base_pct_chg (int, optional): value assming will change first token of LP pair, ie 10 (for +10% change)
+        quote_pct_chg (int, optional): value assming will change first token of LP pair, ie -30 (for -30% change)
+        grid_size (int, optional): number of grid points for each token price, default=300
+        pct_range (tuple, optional): (min, max) grid prices as percentage of current price, default=(1, 300)
+
+    Returns:
+        dict: {'px_base': base prices axis, 'px_quote': quote prices axis,
+               'grid_base', 'grid_quote': meshgrid of prices (shape grid_size x grid_size),
+               'iloss': impermanent loss matrix, rows for quote prices & columns for base prices,
+               'px_base_f', 'px_quote_f': final prices, 'value_f': final value, 'iloss_f': final impermanent loss}
+    """
+    mult = np.linspace(pct_range[0], pct_range[1], grid_size) / 100
+    grid_base, grid_quote = np.meshgrid(px_base * mult, px_quote * mult)
+    surface = _iloss(mult[np.newaxis, :] / mult[:, np.newaxis])
 
+    return {'px_base': px_base * mult, 'px_quote': px_quote * mult,
+            'grid_base': grid_base, 'grid_quote': grid_quote, 'iloss': surface,
+            **_ilossFinal(px_base, px_quote, value, base_pct_chg, quote_pct_chg)}
 
-from scipy import interpolate
-import matplotlib.cm as cm
 
-def iloss_simulate(base_token, quote_token, value=100, base_pct_chg=0, quote_pct_chg=0):
+def _ilossFinal(px_base, px_quote, value=100, base_pct_chg=0, quote_pct_chg=0):
+    """final prices, value & impermanent loss of iloss_surface(), without the surface"""
+    if all(isinstance(i, (int, float)) for i in (value, base_pct_chg, quote_pct_chg)):
+        q_base, q_quote = (value/2)/px_base, (value/2)/px_quote
+        px_base_f = px_base * (1+base_pct_chg/100)
+        px_quote_f = px_quote * (1+quote_pct_chg/100)
+        iloss_f = _iloss((px_base_f / px_base) / (px_quote_f / px_quote))
+        value_f = (px_base_f*q_base + px_quote_f * q_quote) * (iloss_f+1)
+    else:
+        px_base_f, px_quote_f = px_base, px_quote
+        iloss_f = 0
+        value_f = None
+
+    return {'px_base_f': px_base_f, 'px_quote_f': px_quote_f, 'value_f': value_f, 'iloss_f': iloss_f}
+
+
+def iloss_simulate(base_token, quote_token, value=100, base_pct_chg=0, quote_pct_chg=0,
+                   grid_size=300, pct_range=(1, 300), plot=True):
     """Calculate simulated impermanent loss from an initial value invested, get real time prices from pancakeswap API
-        This method create a 3D interpolated surface for impermanent loss and initial/final value invested
+        This method create a 3D surface for impermanent loss and initial/final value invested
 
     Args:
         base_token (string): Pair first token, ie CAKE
@@ -517,7 +998,10 @@ def iloss_simulate(base_token, quote_token, value=100, base_pct_chg=0, quote_pct
         value (int, optional): Value investen in LP default=100
         base_pct_chg (int, optional): value assming will change first token of LP pair, ie 10 (for +10% change)
         quote_pct_chg (int, optional): value assming will change first token of LP pair, ie -30 (for -30% change)
-    
+        grid_size (int, optional): number of grid points for each token price, default=300
+        pct_range (tuple, optional): (min, max) grid prices as percentage of current price, default=(1, 300)
+        plot (bool, optional): if True (default) plot the 3D surface, else only compute results
+
     Returns:
         tuple (value_f, iloss): final value of value invested, and decimal impermanent loss
     """
@@ -525,82 +1009,29 @@ def iloss_simulate(base_token, quote_token, value=100, base_pct_chg=0, quote_pct
     quote_token = 'WBNB' if quote_token.upper() == 'BNB' else quote_token
     
     # get real time prices
-    tokens = pcsTokens()
-    px_base = float(tokens.loc[tokens.symbol.str.upper()==base_token.upper()].price)
-    px_quote = float(tokens.loc[tokens.symbol.str.upper()==quote_token.upper()].price)
-
-    # Prepare grid
-    q_base, q_quote = (value/2)/px_base,  (value/2)/px_quote
-    px_base, px_quote, q_base, q_quote
-    pxs_base = [px_base*i/100 for i in range(1,301)]
-    pxs_quote = [px_quote*i/100 for i in range(1,301)]
-    rows = []
-    for px_b in pxs_base:
-        for px_q in pxs_quote:
-            ratio = (px_b / px_base) / (px_q / px_quote)
-            iloss = 2 * (ratio**0.5 / (1 + ratio)) - 1
-
-            row = {'px_base':px_b, 'px_quote':px_q, 
-                   'ratio':(px_b / px_base) / (px_q / px_quote),
-                   'impremante_loss':iloss}
-            rows.append(row)
-    df = pd.DataFrame(rows)
-    df_ok = df.loc[:,['px_base','px_quote','impremante_loss']]
-    df_ok = df_ok.replace('NaN',np.nan).dropna()
-
-    if all(isinstance(i, (int, float)) for i in (value, base_pct_chg, quote_pct_chg)):
-        px_base_f = px_base * (1+base_pct_chg/100)
-        px_quote_f = px_quote * (1+quote_pct_chg/100)
-        ratio = (px_base_f / px_base) / ( px_quote_f / px_quote)
-        iloss = 2 * (ratio**0.5 / (1 + ratio)) - 1
-        value_f = (px_base_f*q_base + px_quote_f * q_quote) * (iloss+1)
-    else:
-        px_base_f, px_quote_f = px_base, px_quote
-        iloss = 0
-        value_f = None
+    with span('iloss_simulate.prices'):
+        px_base = float(_pcs_index.token(base_token)['price'])
+        px_quote = float(_pcs_index.token(quote_token)['price'])
+
+    with span('iloss_simulate.surface', grid_size=grid_size):
+        res = iloss_surface(px_base, px_quote, value, base_pct_chg, quote_pct_chg, grid_size, pct_range)
+    value_f, iloss = res['value_f'], res['iloss_f']
+    if value_f is None:
         print('must input numerical amount and pct change for base and quote to calculations of final value')
-        
-
-    # Ploting surface
-    fig = plt.figure(figsize=(8,8))
-    x1 = np.linspace(df_ok['px_base'].min(), df_ok['px_base'].max(), len(df_ok['px_base'].unique()))
-    y1 = np.linspace(df_ok['px_quote'].min(), df_ok['px_quote'].max(), len(df_ok['px_quote'].unique()))
-    x2, y2 = np.meshgrid(x1, y1)
-    Z = interpolate.griddata((df_ok['px_base'], df_ok['px_quote']), df_ok['impremante_loss'], (x2, y2))
-    Z[np.isnan(Z)] = df_ok.impremante_loss.mean()
-    ax = plt.axes(projection='3d', alpha=0.2)
-    ax.plot_wireframe(x2, y2, Z, color='tab:blue', lw=1, cmap='viridis', alpha=0.6) 
-        
-    # Start values ploting
-    xmax = df_ok.px_base.max() 
-    ymax = df_ok.px_quote.max()
-    ax.plot([px_base, px_base], [0,px_quote], [-1,-1], ls='--', c='k', lw=1)
-    ax.plot([px_base, px_base], [px_quote,px_quote], [0,-1], ls='--', c='k', lw=1)
-    ax.plot([px_base, 0], [px_quote, px_quote], [-1,-1], ls='--', c='k', lw=1)
-
-    # End values ploting
-    ax.plot([px_base_f, px_base_f], [0,px_quote_f], [-1,-1], ls='--', c='gray', lw=1)
-    ax.plot([px_base_f, px_base_f], [px_quote_f,px_quote_f], [iloss,-1], ls='--', c='gray', lw=1)
-    ax.plot([px_base_f, 0], [px_quote_f, px_quote_f], [-1,-1], ls='--', c='gray', lw=1)
-    ax.plot([px_base_f, px_base_f], [px_quote_f,ymax], [iloss,iloss], ls='--', c='gray', lw=1)
-    ax.plot([px_base_f, 0], [ymax,ymax], [iloss,iloss], ls='--', c='gray', lw=1)
-    
-    # Plot settings
-    # Colorbar only for plot_surface() method instead plot_wireframe()
-    # m = cm.ScalarMappable(cmap=cm.viridis) 
-    # m.set_array(df_ok['impremante_loss'])
-    # plt.colorbar(m, fraction=0.02, pad=0.1)
-    x, y, z = (px_base, px_quote,.05)
-    p = ax.scatter(x, y, z, c='k', marker='v', s=300)
-    ax.set_title('Impermanent Loss 3D Surface', y=0.95)
-    ax.set_xlabel(f'Price {base_token}')
-    ax.set_ylabel(f'Price {quote_token}')
-    ax.set_zlabel('Impremante loss')
-    ax.view_init(elev=25, azim=240) # start view angle
+
+    if plot:
+        with span('iloss_simulate.plot'):
+            from .render import drawIloss
+            plt = _pyplot()
+            fig = plt.figure(figsize=(8,8))
+            drawIloss(fig, {'base_token': base_token, 'quote_token': quote_token, 'value': value,
+                            'base_pct_chg': base_pct_chg, 'quote_pct_chg': quote_pct_chg, 'grid_size': grid_size,
+                            'pct_range': pct_range, 'px_base': px_base, 'px_quote': px_quote, 'surface': res})
     
     print (f"\nStart value USD {value:.0f}, {base_token} USD {px_base:.2f}, {quote_token} USD {px_quote:.2f}")    
     print(f"\nResults assuming {base_token.upper()} {base_pct_chg}%, and {quote_token.upper()} {quote_pct_chg}%")
     print (f"End value estimate USD {value_f:.0f}, iloss: {iloss:.2%}")
-    plt.show()
+    if plot:
+        plt.show()
 
-    return value_f , iloss
\ No newline at end of file
+    return value_f , iloss
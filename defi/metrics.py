@@ -0,0 +1,217 @@
+"""Instrumentation spans for API calls and compute stages
+
+Fetchers and compute functions open spans with span(name, **attrs). When no hook is
+registered span() returns a shared no-op object, so instrumentation costs one function
+call per span when disabled. Hooks are callables receiving one dict per finished span:
+
+    {'name': 'http', 'id': 7, 'parent': 6, 'ts': 1700000000.0, 'duration': 0.41,
+     'error': None, 'url': 'https://api.coingecko.com/api/v3/coins/{id}/market_chart',
+     'status': 200, 'bytes': 52311, 'retries': 0}
+
+Spans opened inside another span in the same thread or asyncio task have its id as parent,
+ie the http spans of each geckoHistorical() call inside the "farmSimulate.download" stage.
+"""
+import contextvars
+import itertools
+import json
+import re
+import threading
+import time
+
+
+_hooks = ()
+_ids = itertools.count(1)
+_parent = contextvars.ContextVar('defi_span_parent', default=None)
+
+URL_TEMPLATES = [
+    (re.compile(r'/coins/[^/]+/contract/[^/]+/'), '/coins/{platform}/contract/{address}/'),
+    (re.compile(r'/coins/(?!markets|list)[^/]+/'), '/coins/{id}/'),
+    (re.compile(r'(api\.llama\.fi/protocol/)[^/?]+'), r'\1{protocol}'),
+]
+
+
+def urlTemplate(url):
+    """Url with ids & addresses replaced by placeholders, ie ".../coins/{id}/market_chart" """
+    for pattern, repl in URL_TEMPLATES:
+        url = pattern.sub(repl, url)
+    return url
+
+
+def addHook(hook):
+    """Register a callable called with a dict for every finished span, returns the hook"""
+    global _hooks
+    _hooks = _hooks + (hook,)
+    return hook
+
+
+def removeHook(hook):
+    """Unregister a hook added with addHook()"""
+    global _hooks
+    _hooks = tuple(h for h in _hooks if h is not hook)
+
+
+def enabled():
+    """True if any hook is registered"""
+    return bool(_hooks)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """Timed span, use span() to create it
+
+    Attributes set with set() while the span is open are sent to the hooks when it ends,
+    with the url attribute replaced by its urlTemplate().
+    """
+
+    __slots__ = ('record', '_start', '_token')
+
+    def __init__(self, name, attrs):
+        self.record = {'name': name, 'id': next(_ids), 'parent': None, 'ts': None,
+                       'duration': None, 'error': None, **attrs}
+
+    def set(self, **attrs):
+        """Add or update span attributes"""
+        self.record.update(attrs)
+
+    def __enter__(self):
+        self.record['parent'] = _parent.get()
+        self._token = _parent.set(self.record['id'])
+        self.record['ts'] = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record['duration'] = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.record['error'] = exc_type.__name__
+        _parent.reset(self._token)
+        if 'url' in self.record:
+            self.record['url'] = urlTemplate(self.record['url'])
+        for hook in _hooks:
+            try:
+                hook(self.record)
+            except Exception:
+                pass
+        return False
+
+
+def span(name, **attrs):
+    """Context manager timing a block, ie with span('farmSimulate.plot'): ...
+
+    Args:
+        name (string): span name
+        **attrs: attributes sent to the hooks, more can be added inside the block with .set()
+
+    Returns:
+        Span, or a no-op span when no hook is registered
+    """
+    if not _hooks:
+        return _NOOP
+    return Span(name, attrs)
+
+
+class JsonLinesExporter:
+    """Hook writing every span as one JSON line
+
+    Args:
+        file (string or file object): path (appended to) or open text file
+    """
+
+    def __init__(self, file):
+        self._own = isinstance(file, str)
+        self.file = open(file, 'a') if self._own else file
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        if self._own:
+            self.file.close()
+
+
+class PrometheusExporter:
+    """Hook aggregating span durations into Prometheus histograms
+
+    Spans are grouped by name, url template, status, cache result & error. render() returns the
+    Prometheus text exposition format, so p99 can be read with histogram_quantile().
+
+    Args:
+        buckets (tuple, optional): histogram upper bounds in seconds
+        prefix (str, optional): metric names prefix, default "defi"
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    LABELS = ('name', 'url', 'status', 'cache', 'error')
+
+    def __init__(self, buckets=BUCKETS, prefix='defi'):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        key = tuple(record.get(k) for k in self.LABELS)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = {'counts': [0] * len(self.buckets), 'count': 0, 'sum': 0.0,
+                                         'bytes': 0, 'retries': 0}
+            duration = record['duration']
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    s['counts'][i] += 1
+            s['count'] += 1
+            s['sum'] += duration
+            s['bytes'] += record.get('bytes') or 0
+            s['retries'] += record.get('retries') or 0
+
+    @staticmethod
+    def _labels(key, extra=''):
+        labels = [f'{k}="{v}"' for k, v in zip(PrometheusExporter.LABELS, key) if v is not None]
+        return '{' + ','.join(labels + ([extra] if extra else [])) + '}'
+
+    def render(self):
+        """Prometheus text format of all metrics"""
+        p = self.prefix
+        lines = [f'# TYPE {p}_span_seconds histogram']
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda kv: tuple(str(k) for k in kv[0]))
+            for key, s in series:
+                for bound, count in zip(self.buckets + ('+Inf',), s['counts'] + [s['count']]):
+                    le = 'le="%s"' % bound
+                    lines.append(f'{p}_span_seconds_bucket{self._labels(key, le)} {count}')
+                lines.append(f'{p}_span_seconds_sum{self._labels(key)} {s["sum"]}')
+                lines.append(f'{p}_span_seconds_count{self._labels(key)} {s["count"]}')
+            lines.append(f'# TYPE {p}_response_bytes_total counter')
+            lines += [f'{p}_response_bytes_total{self._labels(k)} {s["bytes"]}' for k, s in series if s['bytes']]
+            lines.append(f'# TYPE {p}_retries_total counter')
+            lines += [f'{p}_retries_total{self._labels(k)} {s["retries"]}' for k, s in series if s['retries']]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write render() output to a file, ie for the node_exporter textfile collector"""
+        with open(path, 'w') as f:
+            f.write(self.render())
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
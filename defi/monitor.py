@@ -0,0 +1,154 @@
+"""Live farming position monitor
+
+FarmMonitor follows the farmSimulate() strategy tick by tick, updating impermanent loss,
+rewards, buy & hold vs farm value and risk metrics in constant time and memory.
+"""
+import datetime
+
+from .defi_tools import _iloss, geckoHistorical
+
+
+class _RunningStats:
+    """Welford running volatility, running max and max drawdown for a value series"""
+
+    def __init__(self, value):
+        self.last = value
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = value
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+
+    def update(self, value):
+        ret = value / self.last - 1
+        self.last = value
+        self.n += 1
+        delta = ret - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (ret - self.mean)
+
+        self.max = max(self.max, value)
+        self.drawdown = value / self.max - 1
+        self.max_drawdown = min(self.max_drawdown, self.drawdown)
+
+    def volatility(self, periods):
+        return (self.m2 / (self.n - 1)) ** 0.5 * periods**0.5 if self.n > 1 else float('nan')
+
+
+class FarmMonitor:
+    """Incremental farming strategy monitor for one LP position
+
+    Args:
+        pair (list): tokens of the pair, ie ["huobi-token", "tether"]
+        apr (float): ie 25 (for 25% Anual rewards)
+        price_a (float): first token price at start
+        price_b (float): second token price at start
+        on_alert (callable, optional): called as on_alert(monitor, kind, message) when an alert is raised,
+            kind is "iloss" when impermanent loss exceeds accrued rewards, or "drawdown"
+        max_drawdown (float, optional): raise a "drawdown" alert when farm drawdown is below this, ie -0.2
+        periods (int, optional): ticks per year to annualize, default 365 (daily ticks)
+    """
+
+    def __init__(self, pair, apr, price_a, price_b, on_alert=None, max_drawdown=None, periods=365):
+        self.pair = list(pair)
+        self.apr = apr
+        self.price_a0, self.price_b0 = price_a, price_b
+        self.on_alert = on_alert
+        self.max_drawdown_alert = max_drawdown
+        self.periods = periods
+        self._alerting = {'iloss': False, 'drawdown': False}
+
+        self.ticks = 1
+        self.rewards = apr / 100 / 365
+        self._set_prices(price_a, price_b)
+        self.stats_farm = _RunningStats(self.farm)
+        self.stats_buy_hold = _RunningStats(self.buy_hold)
+
+    @classmethod
+    def fromHistory(cls, pair, apr, start='2021-01-01', **kwargs):
+        """Monitor started at a past date, catching up with coinGecko daily prices since start
+
+        Args:
+            pair (list): gecko IDs list ["bitcoin",'tether']
+            apr (float): ie 25 (for 25% Anual rewards)
+            start (str, optional): ISO Format YYYY-MM-DD ie "2021-01-01", "2021-01-01" (default)
+            **kwargs: on_alert, max_drawdown & periods, as in FarmMonitor()
+
+        Returns:
+            FarmMonitor: updated with every daily price since start
+        """
+        a, b = (geckoHistorical(coin)['price'] for coin in pair)
+        prices = a.to_frame('a').join(b.rename('b'), how='inner').dropna()
+        prices = prices.loc[prices.index >= datetime.datetime.strptime(start, '%Y-%m-%d')]
+        rows = iter(prices.itertuples(index=False))
+        monitor = cls(pair, apr, *next(rows), **kwargs)
+        for price_a, price_b in rows:
+            monitor.update(price_a, price_b)
+        return monitor
+
+    def _set_prices(self, price_a, price_b):
+        self.token_a = price_a / self.price_a0
+        self.token_b = price_b / self.price_b0
+        self.ratio = self.token_b / self.token_a
+        self.iloss = _iloss(self.ratio)
+        self.buy_hold = (self.token_a + self.token_b) / 2
+        self.farm = self.buy_hold * (1 + self.iloss) * (1 + self.rewards)
+
+    def update(self, price_a, price_b, days=1):
+        """New prices tick
+
+        Args:
+            price_a (float): first token price
+            price_b (float): second token price
+            days (float, optional): days since last tick to accrue rewards, default 1
+
+        Returns:
+            FarmMonitor: self, updated
+        """
+        self.ticks += 1
+        self.rewards += days * self.apr / 100 / 365
+        self._set_prices(price_a, price_b)
+        self.stats_farm.update(self.farm)
+        self.stats_buy_hold.update(self.buy_hold)
+        self._check_alerts()
+        return self
+
+    def _alert(self, kind, active, message):
+        if active and not self._alerting[kind] and self.on_alert is not None:
+            self.on_alert(self, kind, message)
+        self._alerting[kind] = active
+
+    def _check_alerts(self):
+        self._alert('iloss', -self.iloss > self.rewards,
+                    f'{self.pair[0]}-{self.pair[1]}: impermanent loss {self.iloss:.2%} '
+                    f'exceeds accrued rewards {self.rewards:.2%}')
+        if self.max_drawdown_alert is not None:
+            dd = self.stats_farm.drawdown
+            self._alert('drawdown', dd < self.max_drawdown_alert,
+                        f'{self.pair[0]}-{self.pair[1]}: farm drawdown {dd:.2%}')
+
+    def metrics(self):
+        """Current state of the position
+
+        Returns:
+            dict: iloss, rewards, buy_hold & farm returns, and cagr, volatility, sharpe,
+                drawdown & max_drawdown for buy & hold and farm
+        """
+        res = {'ticks': self.ticks, 'iloss': self.iloss, 'rewards': self.rewards,
+               'buy_hold': self.buy_hold - 1, 'farm': self.farm - 1}
+        for name, stats in (('buy_hold', self.stats_buy_hold), ('farm', self.stats_farm)):
+            cagr = stats.last ** (self.periods / self.ticks) - 1
+            vol = stats.volatility(self.periods)
+            res.update({f'cagr_{name}': cagr, f'volatility_{name}': vol,
+                        f'sharpe_{name}': cagr / vol if vol else float('nan'),
+                        f'drawdown_{name}': stats.drawdown, f'max_drawdown_{name}': stats.max_drawdown})
+        return res
+
+    def result(self):
+        """Current state in the same format as farmSimulate() results"""
+        b_h = self.buy_hold - 1
+        return {'Token 1': self.pair[0], 'Token 2': self.pair[1], 'fixed APR': f'{self.apr/100:.0%}',
+                'Buy & Hold': f'{b_h:.2%}', 'Impermanent Loss': f'{self.iloss:.2%}',
+                'Farming Rewards': f'{self.rewards:.2%}',
+                'Farming + Rewards - IL': f'{b_h * (1+self.iloss) * (1+self.rewards):.2%}'}
@@ -0,0 +1,133 @@
+"""Monte Carlo simulation of buy & hold vs staking vs farming outcomes
+
+Simulates correlated geometric brownian motion prices for tokens A & B and evaluates
+the compare() strategies on every path. Only final prices matter for compare(), so
+each path is drawn directly at the horizon, which is exact for this price model.
+Paths are generated and reduced in fixed size chunks, so memory is bounded by the
+chunk size (plus the left tail kept for VaR/CVaR), not by the number of paths.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .defi_tools import _compare, geckoHistorical
+
+
+STRATEGIES = ['buy_hold', 'stake', 'farm']
+
+
+def estimateParams(pair, start=None):
+    """Annualized drift, volatility and correlation of daily log returns from coinGecko history
+
+    Args:
+        pair (list): gecko IDs list ["bitcoin",'tether']
+        start (str, optional): ISO Format YYYY-MM-DD, first date used, default full history
+
+    Returns:
+        dict: {'mu': (mu_A, mu_B), 'sigma': (sigma_A, sigma_B), 'corr': corr}
+    """
+    prices = pd.concat({coin: geckoHistorical(coin)['price'] for coin in pair}, axis=1, sort=True).dropna()
+    if start is not None:
+        prices = prices.loc[prices.index >= start]
+    returns = np.log(prices).diff().dropna()
+    mu = tuple(returns.mean() * 365)
+    sigma = tuple(returns.std() * 365**0.5)
+    return {'mu': mu, 'sigma': sigma, 'corr': float(returns.corr().iloc[0, 1])}
+
+
+def _simulateChunk(seed, n, days, mu, sigma, corr, rewards, edges, tail_size):
+    rng = np.random.default_rng(seed)
+    t = days / 365
+    z = rng.standard_normal((2, n))
+    z[1] = corr * z[0] + (1 - corr**2) ** 0.5 * z[1]
+    var = [(np.exp(mu[i] * t + sigma[i] * t**0.5 * z[i]) - 1) * 100 for i in (0, 1)]
+    outcomes = dict(zip(STRATEGIES, _compare(days, var[0], var[1], *rewards)))
+
+    res = {'n': n, 'farm_wins': int((outcomes['farm'] > outcomes['stake']).sum())}
+    for name, x in outcomes.items():
+        res[name] = {'sum': x.sum(), 'sumsq': (x**2).sum(),
+                     'hist': np.histogram(np.clip(x, edges[0], edges[-1]), edges)[0],
+                     'tail': np.partition(x, tail_size - 1)[:tail_size] if tail_size < n else x}
+    return res
+
+
+def compareMonteCarlo(days, rw_pool_A=0, rw_pool_B=0, rw_pool_AB=0, fees_AB=0, mu=(0, 0), sigma=(0.8, 0.8),
+                      corr=0.0, pair=None, n_paths=1_000_000, chunk_size=100_000, alpha=0.05,
+                      seed=None, processes=None, edges=None):
+    """Monte Carlo distribution of compare() returns for buy&hold, staking and farming
+
+    Args:
+        days (int): days for strategy
+        rw_pool_A (float, optional): Percentual rewards per day for one asset pool (Token A)
+        rw_pool_B (float, optional): Percentual rewards per day for one asset pool (Token B)
+        rw_pool_AB (float, optional): Percentual rewards per day for two asset farm (LP Token AB)
+        fees_AB (float, optional): Percentual provider liquidity fees earned per day
+        mu (tuple, optional): annualized drift of log prices for A & B, default (0, 0)
+        sigma (tuple, optional): annualized volatility for A & B, default (0.8, 0.8)
+        corr (float, optional): correlation between A & B log returns, default 0
+        pair (list, optional): gecko IDs ["bitcoin",'tether'], if given mu, sigma & corr are
+            estimated from their history with estimateParams()
+        n_paths (int, optional): number of simulated paths, default 1,000,000
+        chunk_size (int, optional): paths generated and reduced together, default 100,000
+        alpha (float, optional): VaR & CVaR tail probability, default 0.05
+        seed (int, optional): seed for reproducible results, same seed & chunk_size give the same
+            results with or without processes
+        processes (int, optional): if given, chunks are simulated in a process pool of this size
+        edges (array_like, optional): histogram bin edges for returns, default 1% bins from -100% to +500%
+
+    Returns:
+        dict: {'summary': DataFrame with mean, std, VaR, CVaR (as positive losses) and quantiles per strategy,
+               'prob_farm_beats_stake': probability, 'histogram': DataFrame of path counts per return bin,
+               'params': simulation parameters}
+    """
+    if pair is not None:
+        params = estimateParams(pair)
+        mu, sigma, corr = params['mu'], params['sigma'], params['corr']
+    edges = np.linspace(-1, 5, 601) if edges is None else np.asarray(edges, dtype=float)
+    rewards = (rw_pool_A, rw_pool_B, rw_pool_AB, fees_AB)
+    tail_size = max(1, int(np.ceil(alpha * n_paths)))
+
+    sizes = [chunk_size] * (n_paths // chunk_size) + ([n_paths % chunk_size] if n_paths % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(s, n, days, mu, sigma, corr, rewards, edges, min(tail_size, n)) for s, n in zip(seeds, sizes)]
+
+    totals = {name: {'sum': 0.0, 'sumsq': 0.0, 'hist': np.zeros(len(edges) - 1, dtype=np.int64),
+                     'tail': np.empty(0)} for name in STRATEGIES}
+    farm_wins = 0
+
+    def reduce(res):
+        nonlocal farm_wins
+        farm_wins += res['farm_wins']
+        for name in STRATEGIES:
+            tot, part = totals[name], res[name]
+            tot['sum'] += part['sum']
+            tot['sumsq'] += part['sumsq']
+            tot['hist'] += part['hist']
+            tail = np.concatenate([tot['tail'], part['tail']])
+            tot['tail'] = np.partition(tail, tail_size - 1)[:tail_size] if len(tail) > tail_size else tail
+
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for res in pool.map(_simulateChunk, *zip(*args)):
+                reduce(res)
+    else:
+        for arg in args:
+            reduce(_simulateChunk(*arg))
+
+    rows = {}
+    for name in STRATEGIES:
+        tot = totals[name]
+        mean = tot['sum'] / n_paths
+        std = max(tot['sumsq'] / n_paths - mean**2, 0) ** 0.5 * (n_paths / max(n_paths - 1, 1)) ** 0.5
+        tail = np.sort(tot['tail'])
+        cdf = np.cumsum(tot['hist']) / n_paths
+        quantiles = {f'q{int(q*100):02d}': edges[1:][np.searchsorted(cdf, q)] for q in (0.05, 0.25, 0.5, 0.75, 0.95)}
+        rows[name] = {'mean': mean, 'std': std, 'VaR': -tail[-1], 'CVaR': -tail.mean(), **quantiles}
+
+    return {'summary': pd.DataFrame(rows).T,
+            'prob_farm_beats_stake': farm_wins / n_paths,
+            'histogram': pd.DataFrame({name: totals[name]['hist'] for name in STRATEGIES},
+                                      index=pd.Index(edges[:-1], name='return_from')),
+            'params': {'days': days, 'mu': mu, 'sigma': sigma, 'corr': corr, 'n_paths': n_paths,
+                       'alpha': alpha, 'seed': seed}}
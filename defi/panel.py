@@ -0,0 +1,165 @@
+"""Aligned price panel for many coins
+
+PricePanel keeps the histories of many coins on one shared daily date index, as one
+contiguous (time x coin) numpy block per field (price, market_caps, total_volumes) plus
+a missing data mask per field. Blocks are Fortran ordered, so each coin history is
+contiguous and coins, pairs & date windows are numpy views, not copies.
+
+    panel = PricePanel.fromGecko(['bitcoin', 'ethereum', 'tether'], dtype='float32')
+    a, b, valid = panel.pair('bitcoin', 'tether', start='2021-01-01')
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .defi_tools import _geckoRateLimiter, geckoHistorical
+
+
+class PricePanel:
+    """Date x coin blocks of price, market cap & volume histories
+
+    Args:
+        dates (DatetimeIndex): shared daily dates, sorted
+        coins (list): coin IDs, one column per coin
+        data (dict): {field: (dates x coins) array}, NaN where missing
+        dtype (str, optional): "float64" (default) or "float32"
+    """
+
+    def __init__(self, dates, coins, data, dtype='float64'):
+        self.dates = pd.DatetimeIndex(dates, name='date')
+        self.coins = list(coins)
+        self.dtype = np.dtype(dtype)
+        self.data = {f: np.asarray(v, dtype=self.dtype, order='F') for f, v in data.items()}
+        self.masks = {f: ~np.isnan(v) for f, v in self.data.items()}
+        self._columns = {c: i for i, c in enumerate(self.coins)}
+        self.errors = {}
+
+    @classmethod
+    def fromHistories(cls, histories, fields=('price',), dtype='float64'):
+        """Panel from many geckoHistorical() DataFrames, filled in one pass without intermediate frames
+
+        Args:
+            histories (dict): {coin: DataFrame as returned by geckoHistorical()}
+            fields (tuple, optional): fields to keep, any of "price", "market_caps", "total_volumes",
+                default ("price",)
+            dtype (str, optional): "float64" (default) or "float32"
+
+        Returns:
+            PricePanel: dates are the union of all daily dates, the last value of each day is kept
+        """
+        days = {}
+        for coin, df in histories.items():
+            d = df.index.values.astype('datetime64[D]')
+            last_of_day = np.r_[d[1:] != d[:-1], True] if len(d) else np.zeros(0, dtype=bool)
+            days[coin] = (d, last_of_day)
+        dates = np.unique(np.concatenate([d[keep] for d, keep in days.values()])) if days else \
+            np.array([], dtype='datetime64[D]')
+
+        coins = list(histories)
+        data = {f: np.full((len(dates), len(coins)), np.nan, dtype=dtype, order='F') for f in fields}
+        for j, coin in enumerate(coins):
+            d, keep = days[coin]
+            rows = np.searchsorted(dates, d[keep])
+            values = histories[coin][list(fields)].to_numpy(dtype=float)[keep]
+            for k, f in enumerate(fields):
+                data[f][rows, j] = values[:, k]
+        return cls(dates.astype('datetime64[ns]'), coins, data, dtype)
+
+    @classmethod
+    def fromGecko(cls, coins, fields=('price',), dtype='float64', max_workers=4, rate_limit=None):
+        """Panel downloading coinGecko histories concurrently with geckoHistorical() (and its cache)
+
+        Args:
+            coins (list): gecko IDs, ie ["bitcoin", "ethereum"]
+            fields (tuple, optional): fields to keep, default ("price",)
+            dtype (str, optional): "float64" (default) or "float32"
+            max_workers (int, optional): max concurrent requests, default 4
+            rate_limit (RateLimiter, optional): limiter shared by all requests, default 30 calls per minute
+
+        Returns:
+            PricePanel: coins that failed are left out, with their error message in .errors
+        """
+        rate_limit = _geckoRateLimiter() if rate_limit is None else rate_limit
+
+        def fetch(coin):
+            rate_limit.acquire()
+            try:
+                return geckoHistorical(coin), None
+            except Exception as e:
+                return None, f'{type(e).__name__}: {e}'
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = dict(zip(coins, pool.map(fetch, coins)))
+        panel = cls.fromHistories({c: df for c, (df, err) in results.items() if df is not None}, fields, dtype)
+        panel.errors = {c: err for c, (df, err) in results.items() if err is not None}
+        return panel
+
+    def __repr__(self):
+        span = f'{self.dates[0]:%Y-%m-%d} to {self.dates[-1]:%Y-%m-%d}' if len(self.dates) else 'empty'
+        return (f'PricePanel({len(self.dates)} dates x {len(self.coins)} coins, {span}, '
+                f'fields={list(self.data)}, dtype={self.dtype})')
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.coins)
+
+    @property
+    def nbytes(self):
+        """memory used by values & masks"""
+        return sum(v.nbytes for v in self.data.values()) + sum(m.nbytes for m in self.masks.values())
+
+    def _rows(self, start=None, end=None):
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start))
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return slice(lo, hi)
+
+    def column(self, coin):
+        """column position of a coin"""
+        return self._columns[coin]
+
+    def values(self, field='price', start=None, end=None):
+        """(dates x coins) view of a field, optionally for a date window"""
+        return self.data[field][self._rows(start, end)]
+
+    def series(self, coin, field='price', start=None, end=None):
+        """contiguous view of one coin history, NaN where missing"""
+        return self.data[field][self._rows(start, end), self._columns[coin]]
+
+    def mask(self, coin, field='price', start=None, end=None):
+        """view of the valid (not missing) rows mask of one coin"""
+        return self.masks[field][self._rows(start, end), self._columns[coin]]
+
+    def pair(self, a, b, field='price', start=None, end=None):
+        """Views of two coins histories and the mask of rows where both have values
+
+        Returns:
+            tuple (ndarray, ndarray, ndarray): a values, b values & joint valid mask
+        """
+        rows = self._rows(start, end)
+        i, j = self._columns[a], self._columns[b]
+        mask = self.masks[field]
+        return self.data[field][rows, i], self.data[field][rows, j], mask[rows, i] & mask[rows, j]
+
+    def window(self, start=None, end=None):
+        """Panel for a date window, sharing memory with this one"""
+        rows = self._rows(start, end)
+        panel = PricePanel.__new__(PricePanel)
+        panel.dates, panel.coins, panel.dtype = self.dates[rows], self.coins, self.dtype
+        panel.data = {f: v[rows] for f, v in self.data.items()}
+        panel.masks = {f: m[rows] for f, m in self.masks.items()}
+        panel._columns, panel.errors = self._columns, self.errors
+        return panel
+
+    def select(self, coins):
+        """Panel with only some coins (a copy of their columns)"""
+        cols = [self._columns[c] for c in coins]
+        return PricePanel(self.dates, coins, {f: v[:, cols] for f, v in self.data.items()}, self.dtype)
+
+    def frame(self, field='price', coins=None, start=None, end=None):
+        """DataFrame of a field, date indexed with a column per coin"""
+        values = self.values(field, start, end)
+        if coins is not None:
+            values = values[:, [self._columns[c] for c in coins]]
+        return pd.DataFrame(values, index=self.dates[self._rows(start, end)],
+                            columns=self.coins if coins is None else list(coins), copy=False)
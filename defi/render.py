@@ -0,0 +1,214 @@
+"""Headless rendering of farmSimulate() & iloss_simulate() charts
+
+Results are computed first (farmReport(), ilossReport()) into plain dicts, then drawn
+with the matplotlib object oriented API on Figures with an Agg canvas, without pyplot
+global state, so rendering is thread safe and needs no display. renderReports() spreads
+the drawing of many reports across a process pool and writes PNG or SVG files.
+
+    reports = [farmReport(pair, 25) for pair in pairs]
+    renderReports(reports, 'reports/', fmt='png', processes=8)
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from pandas.plotting import register_matplotlib_converters
+
+from .defi_tools import _farmFrame, _farmResult, _ilossFinal, _pcs_index, geckoHistorical, iloss_surface
+
+register_matplotlib_converters()
+
+FARM_SIZE = (15, 8)
+ILOSS_SIZE = (8, 8)
+
+
+def farmReport(pair, apr, start='2021-01-01', prices=None):
+    """Compute farmSimulate() results to render later
+
+    Args:
+        pair (list): gecko IDs list ["bitcoin",'tether']
+        apr (float): ie 25 (for 25% Anual rewards)
+        start (str, optional): ISO Format YYYY-MM-DD ie "2021-01-01", "2021-01-01" (default)
+        prices (DataFrame, optional): date indexed prices with one column per coin of pair, downloaded if None
+
+    Returns:
+        dict: {'kind': 'farm', 'pair', 'apr', 'start', 'farm': daily strategy DataFrame,
+               'cagrs', 'sigmas', 'sharpes', 'dd', 'result': farmSimulate() results dict}
+    """
+    if prices is None:
+        prices = pd.concat({coin: geckoHistorical(coin)['price'] for coin in pair}, axis=1, sort=True)
+    farm, cagrs, sigmas, sharpes, dd = _farmFrame(prices[list(pair)], apr, start)
+    return {'kind': 'farm', 'pair': list(pair), 'apr': apr, 'start': start, 'farm': farm,
+            'cagrs': cagrs, 'sigmas': sigmas, 'sharpes': sharpes, 'dd': dd,
+            'result': _farmResult(pair, apr, start, farm)}
+
+
+def ilossReport(base_token, quote_token, value=100, base_pct_chg=0, quote_pct_chg=0,
+                grid_size=300, pct_range=(1, 300), px_base=None, px_quote=None):
+    """Compute iloss_simulate() results to render later
+
+    Args:
+        base_token (string): Pair first token, ie CAKE
+        quote_token (string): Pais second token, ie BNB
+        value (int, optional): Value investen in LP default=100
+        base_pct_chg (int, optional): value assming will change first token of LP pair, ie 10 (for +10% change)
+        quote_pct_chg (int, optional): value assming will change first token of LP pair, ie -30 (for -30% change)
+        grid_size (int, optional): number of grid points for each token price, default=300
+        pct_range (tuple, optional): (min, max) grid prices as percentage of current price, default=(1, 300)
+        px_base (float, optional): first token price, real time pancakeswap price if None
+        px_quote (float, optional): second token price, real time pancakeswap price if None
+
+    Returns:
+        dict: {'kind': 'iloss', inputs, 'px_base', 'px_quote', 'value_f', 'iloss_f'}.
+            The surface itself is recomputed when drawing, so reports are small to send to other processes
+    """
+    base_token = 'WBNB' if base_token.upper() == 'BNB' else base_token
+    quote_token = 'WBNB' if quote_token.upper() == 'BNB' else quote_token
+    px_base = float(_pcs_index.token(base_token)['price']) if px_base is None else px_base
+    px_quote = float(_pcs_index.token(quote_token)['price']) if px_quote is None else px_quote
+    # only final values here, the surface is computed when drawing
+    res = _ilossFinal(px_base, px_quote, value, base_pct_chg, quote_pct_chg)
+    return {'kind': 'iloss', 'base_token': base_token, 'quote_token': quote_token, 'value': value,
+            'base_pct_chg': base_pct_chg, 'quote_pct_chg': quote_pct_chg, 'grid_size': grid_size,
+            'pct_range': pct_range, 'px_base': px_base, 'px_quote': px_quote,
+            'value_f': res['value_f'], 'iloss_f': res['iloss_f']}
+
+
+def drawFarm(fig, report):
+    """Draw the farmSimulate() 6 panels chart of a farmReport() on a matplotlib Figure"""
+    pair, farm = report['pair'], report['farm']
+    gs = fig.add_gridspec(nrows=2, ncols=4, height_ratios=[2, 1], hspace=0.45, wspace=0.35, top=.9)
+    ax_upleft = fig.add_subplot(gs[0, 0:2])
+    ax_upright = fig.add_subplot(gs[0, 2:])
+    ax_down = [fig.add_subplot(gs[1, i]) for i in range(4)]
+
+    ax_upleft.plot(farm.iloss.abs(), label='Impermanent Loss')
+    ax_upleft.plot(farm.rewards, label='Farming Rewards')
+    ax_upleft.legend()
+    ax_upleft.grid()
+    ax_upleft.set_title('Impermanent Loss vs Farming Rewards')
+    ax_upleft.tick_params(axis='x', rotation=45)
+
+    ax_upright.plot(farm.iloc[:, :2])
+    ax_upright.plot(farm.buy_hold)
+    ax_upright.plot(farm.farm)
+    ax_upright.grid()
+    ax_upright.legend([pair[0], pair[1], 'Buy&Hold', 'Farming Strategy'])
+    ax_upright.set_title(f'{pair[0]} vs {pair[1]} vs Buy & Hold vs Farming strategy payoff')
+    ax_upright.tick_params(axis='x', rotation=45)
+
+    columns = [pair[0], pair[1], 'buy_hold', 'farm']
+    stats = [('CAGR', report['cagrs']), ('Anualized Volatility', report['sigmas']),
+             ('Sharpe Ratio', report['sharpes']), ('Max DrawDowns', report['dd'].min())]
+    for ax, (title, values) in zip(ax_down, stats):
+        ax.bar(columns, values[columns].to_numpy(), width=0.5)
+        ax.tick_params(axis='x', rotation=90)
+        ax.set_title(title, fontsize=12)
+        ax.grid(alpha=0.4)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+    return fig
+
+
+def drawIloss(fig, report):
+    """Draw the iloss_simulate() 3D impermanent loss surface of an ilossReport() on a matplotlib Figure
+
+    The iloss_surface() results in report['surface'] are used if present, else the surface is computed
+    """
+    res = report.get('surface')
+    if res is None:
+        res = iloss_surface(report['px_base'], report['px_quote'], report['value'], report['base_pct_chg'],
+                            report['quote_pct_chg'], report['grid_size'], report['pct_range'])
+    px_base, px_quote = report['px_base'], report['px_quote']
+    px_base_f, px_quote_f, iloss = res['px_base_f'], res['px_quote_f'], res['iloss_f']
+
+    ax = fig.add_subplot(projection='3d', alpha=0.2)
+    ax.plot_wireframe(res['grid_base'], res['grid_quote'], res['iloss'], color='tab:blue', lw=1, alpha=0.6)
+
+    # Start values ploting
+    ymax = res['px_quote'].max()
+    ax.plot([px_base, px_base], [0, px_quote], [-1, -1], ls='--', c='k', lw=1)
+    ax.plot([px_base, px_base], [px_quote, px_quote], [0, -1], ls='--', c='k', lw=1)
+    ax.plot([px_base, 0], [px_quote, px_quote], [-1, -1], ls='--', c='k', lw=1)
+
+    # End values ploting
+    ax.plot([px_base_f, px_base_f], [0, px_quote_f], [-1, -1], ls='--', c='gray', lw=1)
+    ax.plot([px_base_f, px_base_f], [px_quote_f, px_quote_f], [iloss, -1], ls='--', c='gray', lw=1)
+    ax.plot([px_base_f, 0], [px_quote_f, px_quote_f], [-1, -1], ls='--', c='gray', lw=1)
+    ax.plot([px_base_f, px_base_f], [px_quote_f, ymax], [iloss, iloss], ls='--', c='gray', lw=1)
+    ax.plot([px_base_f, 0], [ymax, ymax], [iloss, iloss], ls='--', c='gray', lw=1)
+
+    ax.scatter(px_base, px_quote, .05, c='k', marker='v', s=300)
+    ax.set_title('Impermanent Loss 3D Surface', y=0.95)
+    ax.set_xlabel(f"Price {report['base_token']}")
+    ax.set_ylabel(f"Price {report['quote_token']}")
+    ax.set_zlabel('Impremante loss')
+    ax.view_init(elev=25, azim=240)  # start view angle
+    return fig
+
+
+DRAW = {'farm': (drawFarm, FARM_SIZE), 'iloss': (drawIloss, ILOSS_SIZE)}
+
+
+def reportFigure(report):
+    """New Agg Figure with the chart of a farmReport() or ilossReport()"""
+    draw, figsize = DRAW[report['kind']]
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return draw(fig, report)
+
+
+def reportName(report):
+    """default file name (without extension) for a report, ie "farm_bitcoin_tether_25" """
+    if report['kind'] == 'farm':
+        name = f"farm_{report['pair'][0]}_{report['pair'][1]}_{report['apr']}"
+    else:
+        name = f"iloss_{report['base_token']}_{report['quote_token']}_{report['base_pct_chg']}_{report['quote_pct_chg']}"
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name)
+
+
+def renderReport(report, path, dpi=100):
+    """Render a report to a file, format from the extension ie ".png" or ".svg"
+
+    Returns:
+        string: path
+    """
+    fig = reportFigure(report)
+    fig.savefig(path, dpi=dpi)
+    return path
+
+
+def _renderJob(args):
+    report, path, dpi = args
+    try:
+        return renderReport(report, path, dpi), None
+    except Exception as e:
+        return path, f'{type(e).__name__}: {e}'
+
+
+def renderReports(reports, path, fmt='png', dpi=100, processes=None, names=None):
+    """Render many reports to files, in parallel processes
+
+    Args:
+        reports (list): farmReport() or ilossReport() dicts
+        path (string): output directory
+        fmt (str, optional): "png" (default) or "svg"
+        dpi (int, optional): resolution for png files, default 100
+        processes (int, optional): process pool size, default os.cpu_count(). 0 renders in this process
+        names (list, optional): file names without extension, default reportName() of each report
+
+    Returns:
+        DataFrame: one row per report with file path and error message (None if rendered)
+    """
+    os.makedirs(path, exist_ok=True)
+    names = [reportName(r) for r in reports] if names is None else names
+    jobs = [(r, os.path.join(path, f'{n}.{fmt}'), dpi) for r, n in zip(reports, names)]
+    if processes == 0:
+        results = [_renderJob(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(_renderJob, jobs))
+    return pd.DataFrame(results, columns=['file', 'error'], index=pd.Index(names, name='report'))
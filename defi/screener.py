@@ -0,0 +1,144 @@
+"""Liquidity pool screener for pancakeswap pairs
+
+Ranks the top pairs by liquidity using each pair's historical price ratio volatility,
+expected impermanent loss, fee yield and the rewards APR needed to break even.
+Histories are downloaded once per token and shared by every pair containing it, and
+all pair statistics are computed from one aligned price matrix.
+"""
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .defi_tools import _geckoRateLimiter, _iloss, geckoHistoricalContract, pcsPairs
+
+
+def fetchHistories(addresses, platform='binance-smart-chain', max_workers=4, rate_limit=None):
+    """Daily price history for many token contracts, downloaded concurrently
+
+    Args:
+        addresses (list): token contract addresses
+        platform (str, optional): coinGecko asset platform, default "binance-smart-chain"
+        max_workers (int, optional): max concurrent requests, default 4
+        rate_limit (RateLimiter, optional): limiter shared by all requests, default 30 calls per minute
+
+    Returns:
+        tuple (dict, dict): {address: price Series} for downloaded tokens & {address: error message} for failures
+    """
+    rate_limit = _geckoRateLimiter() if rate_limit is None else rate_limit
+
+    def fetch(address):
+        rate_limit.acquire()
+        try:
+            return geckoHistoricalContract(address, platform)['price'], None
+        except Exception as e:
+            return None, f'{type(e).__name__}: {e}'
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = dict(zip(addresses, pool.map(fetch, addresses)))
+    histories = {a: s for a, (s, err) in results.items() if s is not None}
+    errors = {a: err for a, (s, err) in results.items() if err is not None}
+    return histories, errors
+
+
+def priceMatrix(histories, days=None):
+    """Aligned daily prices, one column per token
+
+    Args:
+        histories (dict): {token: price Series} date indexed
+        days (int, optional): keep only the last days, default all
+
+    Returns:
+        DataFrame: date x token prices, NaN where a token has no price
+    """
+    daily = {k: s.groupby(s.index.normalize()).last() for k, s in histories.items()}
+    prices = pd.concat(daily, axis=1, sort=True) if daily else pd.DataFrame()
+    return prices.iloc[-days:] if days else prices
+
+
+def expectedIloss(ratio_vol, horizon, nodes=40):
+    """Expected impermanent loss for a lognormal, driftless price ratio
+
+    Args:
+        ratio_vol (array_like): annualized volatility of the price ratio log returns
+        horizon (float): days
+        nodes (int, optional): Gauss-Hermite quadrature nodes, default 40
+
+    Returns:
+        ndarray: expected impermanent loss as decimal values, ie -0.05 for -5%
+    """
+    x, w = np.polynomial.hermite_e.hermegauss(nodes)
+    w = w / np.sqrt(2 * np.pi)
+    sigma = np.asarray(ratio_vol, dtype=float)[..., np.newaxis] * np.sqrt(horizon / 365)
+    return (_iloss(np.exp(sigma * x)) * w).sum(axis=-1)
+
+
+def screenPairs(top=100, days=365, horizon=30, fee=0.0017, pairs=None, histories=None,
+                platform='binance-smart-chain', max_workers=4, rate_limit=None):
+    """Screen & rank pancakeswap pairs for liquidity providing
+
+    Args:
+        top (int, optional): number of pairs by liquidity to screen, default 100
+        days (int, optional): days of history used for volatility & correlation, default 365
+        horizon (int, optional): days of the expected impermanent loss & breakeven, default 30
+        fee (float, optional): share of each swap volume paid to LPs, default 0.0017 (pancakeswap v2)
+        pairs (DataFrame, optional): pairs as returned by pcsPairs(), downloaded if None
+        histories (dict, optional): {token address: price Series} already available, missing ones are downloaded
+        platform (str, optional): coinGecko asset platform, default "binance-smart-chain"
+        max_workers (int, optional): max concurrent history downloads, default 4
+        rate_limit (RateLimiter, optional): limiter shared by all history downloads
+
+    Returns:
+        DataFrame: one row per pair, ranked by breakeven rewards APR, with columns
+            base_symbol, quote_symbol, liquidity, volume_usd, fee_apr (%), ratio_vol (annualized),
+            corr, expected_iloss (over horizon), breakeven_apr (% rewards + fees), breakeven_reward_apr (%),
+            observations and error (tokens without history)
+    """
+    pairs = pcsPairs() if pairs is None else pairs
+    pairs = pairs.sort_values('liquidity', ascending=False).head(top)
+    base = pairs['base_address'].astype(str).str.lower().to_numpy()
+    quote = pairs['quote_address'].astype(str).str.lower().to_numpy()
+
+    histories = {k.lower(): v for k, v in (histories or {}).items()}
+    missing = [a for a in dict.fromkeys(np.concatenate([base, quote])) if a not in histories]
+    errors = {}
+    if missing:
+        fetched, errors = fetchHistories(missing, platform, max_workers, rate_limit)
+        histories.update(fetched)
+
+    prices = priceMatrix(histories, days + 1)
+    columns = {c: i for i, c in enumerate(prices.columns)}
+    matrix = np.hstack([prices.to_numpy(dtype=float), np.full((len(prices), 1), np.nan)])
+    i = np.array([columns.get(a, -1) for a in base])
+    j = np.array([columns.get(a, -1) for a in quote])
+
+    # pairs without history or overlap are left as NaN
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        returns = np.diff(np.log(matrix), axis=0)
+        ra, rb = returns[:, i], returns[:, j]
+        joint = ~(np.isnan(ra) | np.isnan(rb))
+        ra, rb = np.where(joint, ra, np.nan), np.where(joint, rb, np.nan)
+        n = joint.sum(axis=0)
+        ratio_vol = np.nanstd(ra - rb, axis=0, ddof=1) * np.sqrt(365)
+        cov = np.nansum((ra - np.nanmean(ra, axis=0)) * (rb - np.nanmean(rb, axis=0)), axis=0) / (n - 1)
+        corr = cov / (np.nanstd(ra, axis=0, ddof=1) * np.nanstd(rb, axis=0, ddof=1))
+
+        last = np.array([prices[c].dropna().iloc[-1] if prices[c].notna().any() else np.nan for c in prices.columns]
+                        + [np.nan])
+        volume_usd = np.nanmean(np.vstack([pairs['base_volume'].to_numpy(dtype=float) * last[i],
+                                           pairs['quote_volume'].to_numpy(dtype=float) * last[j]]), axis=0)
+        fee_apr = volume_usd * fee / pairs['liquidity'].to_numpy(dtype=float) * 365 * 100
+        il = expectedIloss(ratio_vol, horizon)
+        breakeven_apr = (1 / (1 + il) - 1) * 365 / horizon * 100
+
+    df = pd.DataFrame({'base_symbol': pairs['base_symbol'].astype(str).to_numpy(),
+                       'quote_symbol': pairs['quote_symbol'].astype(str).to_numpy(),
+                       'liquidity': pairs['liquidity'].to_numpy(dtype=float), 'volume_usd': volume_usd,
+                       'fee_apr': fee_apr, 'ratio_vol': ratio_vol, 'corr': corr, 'expected_iloss': il,
+                       'breakeven_apr': breakeven_apr, 'breakeven_reward_apr': breakeven_apr - fee_apr,
+                       'observations': n,
+                       'error': [errors.get(b, errors.get(q)) for b, q in zip(base, quote)]},
+                      index=pairs.index)
+    return df.sort_values('breakeven_reward_apr', na_position='last')
@@ -0,0 +1,351 @@
+"""Local memory-mapped store of DeFi Llama TVL histories for many protocols
+
+TVL is kept in one dense date x protocol float matrix on disk (tvl.<capacity>.dat, row
+major so a date window is contiguous), opened memory-mapped, plus protocols metadata from
+getProtocols() (category, chain, chains...) used to group protocols. New dates are
+appended as rows and new protocols take spare columns, so updates only write what
+changed. Queries read the requested date window in chunks of rows and never load the
+whole matrix in memory.
+
+    store = TvlStore('~/.cache/defi/tvl')
+    store.update()                                  # metadata & every protocol history
+    store.aggregate('category', start='2021-01-01')
+    store.top(10, by='chain')
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .defi_tools import getProtocol, getProtocols
+
+
+DAY = np.timedelta64(1, 'D')
+METADATA_COLUMNS = ['category', 'chain', 'chains', 'symbol', 'slug']
+
+
+class TvlStore:
+    """Date x protocol TVL matrix on disk with protocols metadata
+
+    Args:
+        path (string, optional): store directory, default "~/.cache/defi/tvl"
+        start (str, optional): first date of the store, ISO Format YYYY-MM-DD, default "2018-01-01".
+            Older values are not stored. Only used when the store is created
+        dtype (str, optional): TVL values type, "float32" (default) or "float64". Only used when the store is created
+        chunk_rows (int, optional): dates read at once by queries, default 1024
+    """
+
+    def __init__(self, path='~/.cache/defi/tvl', start='2018-01-01', dtype='float32', chunk_rows=1024):
+        self.path = os.path.expanduser(path)
+        self.chunk_rows = chunk_rows
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            with open(self._file('meta.json')) as f:
+                self._meta = json.load(f)
+        except FileNotFoundError:
+            self._meta = {'start': start, 'dtype': dtype, 'rows': 0, 'capacity': 0, 'protocols': [], 'last': []}
+        try:
+            with open(self._file('protocols.json')) as f:
+                self._metadata = json.load(f)
+        except FileNotFoundError:
+            self._metadata = {}
+        self._columns = {name: i for i, name in enumerate(self._meta['protocols'])}
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write_json(self, name, data):
+        tmp = self._file(name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self._file(name))
+
+    @property
+    def dtype(self):
+        return np.dtype(self._meta['dtype'])
+
+    @property
+    def start(self):
+        return np.datetime64(self._meta['start'], 'D')
+
+    @property
+    def dates(self):
+        """DatetimeIndex of the stored dates"""
+        return pd.DatetimeIndex(self.start + np.arange(self._meta['rows']) * DAY, name='date')
+
+    @property
+    def protocols(self):
+        """stored protocol names, in column order"""
+        return list(self._meta['protocols'])
+
+    @property
+    def metadata(self):
+        """DataFrame of protocols metadata indexed by name"""
+        df = pd.DataFrame.from_dict(self._metadata, orient='index')
+        df.index.name = 'name'
+        return df
+
+    def _matrix(self, mode='r'):
+        if self._meta['rows'] == 0 or self._meta['capacity'] == 0:
+            return np.empty((self._meta['rows'], self._meta['capacity']), dtype=self.dtype)
+        return np.memmap(self._dataFile(), dtype=self.dtype, mode=mode,
+                         shape=(self._meta['rows'], self._meta['capacity']))
+
+    def _dataFile(self):
+        return self._file(self._meta.get('file', 'tvl.dat'))
+
+    def _resize(self, rows, capacity):
+        """grow the matrix to rows x capacity, new cells are NaN
+
+        A wider matrix is written to a new file named by its capacity, and meta.json is saved
+        pointing to it before the old file is removed, so the stored meta always matches the
+        layout of its file, even if the process stops before the next save
+        """
+        old_rows, old_capacity = self._meta['rows'], self._meta['capacity']
+        if capacity > old_capacity:
+            name = f'tvl.{capacity}.dat'
+            new = np.memmap(self._file(name), dtype=self.dtype, mode='w+',
+                            shape=(max(rows, old_rows, 1), capacity))
+            new[:] = np.nan
+            old = self._matrix()
+            for i in range(0, old_rows, self.chunk_rows):
+                new[i:i+self.chunk_rows, :old_capacity] = old[i:i+self.chunk_rows]
+            new.flush()
+            del new, old
+            old_file = self._dataFile()
+            self._meta.update(rows=max(rows, old_rows), capacity=capacity, file=name)
+            self._write_json('meta.json', self._meta)
+            if old_file != self._dataFile() and os.path.exists(old_file):
+                os.remove(old_file)
+            return
+        if rows > old_rows:
+            with open(self._dataFile(), 'r+b' if old_rows else 'w+b') as f:
+                f.seek(old_rows * capacity * self.dtype.itemsize)
+                f.write(np.full((rows - old_rows, capacity), np.nan, dtype=self.dtype).tobytes())
+        self._meta['rows'], self._meta['capacity'] = max(rows, old_rows), max(capacity, old_capacity)
+
+    def _column(self, name):
+        """column of a protocol, adding it (and growing the matrix capacity) if new"""
+        if name not in self._columns:
+            n = len(self._meta['protocols'])
+            if n >= self._meta['capacity']:
+                self._resize(self._meta['rows'], max(64, 2 * self._meta['capacity']))
+            self._meta['protocols'].append(name)
+            self._meta['last'].append(None)
+            self._columns[name] = n
+        return self._columns[name]
+
+    def ingest(self, name, tvl, save=True):
+        """Store the TVL history of a protocol, only dates since its last stored date are written
+
+        Args:
+            name (string): protocol name
+            tvl (DataFrame or Series): date indexed TVL, ie getProtocol(name)[1]
+            save (bool, optional): write the store index after ingesting, default True
+
+        Returns:
+            int: number of dates written
+        """
+        tvl = tvl['totalLiquidityUSD'] if isinstance(tvl, pd.DataFrame) else tvl
+        dates = tvl.index.values.astype('datetime64[D]')
+        keep = dates >= self.start
+        days = (dates[keep] - self.start).astype(np.int64)
+        values = tvl.to_numpy(dtype=np.float64)[keep]
+        if len(days) == 0:
+            return 0
+
+        # last value of each day
+        last_of_day = np.r_[days[1:] != days[:-1], True]
+        days, values = days[last_of_day], values[last_of_day]
+
+        col = self._column(name)
+        last = self._meta['last'][col]
+        if last is not None:
+            new = days >= last
+            days, values = days[new], values[new]
+        if len(days) == 0:
+            return 0
+
+        if days[-1] >= self._meta['rows']:
+            self._resize(int(days[-1]) + 1, self._meta['capacity'])
+        matrix = self._matrix('r+')
+        matrix[days, col] = values
+        matrix.flush()
+        del matrix
+
+        self._meta['last'][col] = int(days[-1])
+        if save:
+            self._write_json('meta.json', self._meta)
+        return len(days)
+
+    def updateMetadata(self, protocols=None):
+        """Store protocols metadata used to group protocols
+
+        Args:
+            protocols (DataFrame, optional): as returned by getProtocols(), downloaded if None
+
+        Returns:
+            DataFrame: stored metadata
+        """
+        if protocols is None:
+            protocols = getProtocols(columns=METADATA_COLUMNS)
+        columns = [c for c in METADATA_COLUMNS if c in protocols.columns]
+        records = protocols[columns].astype(object).where(protocols[columns].notna(), None).to_dict('index')
+        self._metadata.update({str(name): values for name, values in records.items()})
+        self._write_json('protocols.json', self._metadata)
+        return self.metadata
+
+    def update(self, protocols=None, max_workers=4, progress=None):
+        """Incremental update: metadata and TVL history of protocols, downloaded concurrently
+
+        Args:
+            protocols (list, optional): protocol names (or slugs), default all protocols in getProtocols()
+            max_workers (int, optional): max concurrent downloads, default 4
+            progress (callable, optional): called as progress(done, total) after each protocol
+
+        Returns:
+            dict: {protocol: dates written, or the error message if its download failed}
+        """
+        if protocols is None:
+            meta = self.updateMetadata()
+            protocols = meta.index.tolist()
+        slugs = {p: (self._metadata.get(p) or {}).get('slug') or p for p in protocols}
+
+        def fetch(name):
+            try:
+                return name, getProtocol(slugs[name], fields=['name'], compact=True)[1], None
+            except Exception as e:
+                return name, None, f'{type(e).__name__}: {e}'
+
+        res = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for name, tvl, error in pool.map(fetch, protocols):
+                res[name] = error if error else self.ingest(name, tvl, save=False)
+                if progress is not None:
+                    progress(len(res), len(protocols))
+        self._write_json('meta.json', self._meta)
+        return res
+
+    def _window(self, start, end):
+        dates = self.dates
+        lo = 0 if start is None else dates.searchsorted(pd.Timestamp(start))
+        hi = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end), side='right')
+        return lo, hi
+
+    def _select(self, protocols):
+        if protocols is None:
+            return np.arange(len(self._meta['protocols']))
+        return np.array([self._columns[p] for p in protocols], dtype=np.int64)
+
+    def frame(self, protocols=None, start=None, end=None):
+        """TVL of some protocols over a date window
+
+        Args:
+            protocols (list, optional): protocol names, default all
+            start (str, optional): first date, ISO Format YYYY-MM-DD, default first stored date
+            end (str, optional): last date (included), default last stored date
+
+        Returns:
+            DataFrame: date x protocol TVL, NaN where a protocol has no value
+        """
+        lo, hi = self._window(start, end)
+        cols = self._select(protocols)
+        values = np.asarray(self._matrix()[lo:hi][:, cols])
+        return pd.DataFrame(values, index=self.dates[lo:hi], columns=[self._meta['protocols'][c] for c in cols])
+
+    def _groups(self, by):
+        """indicator matrix protocol x group, protocols with list values (ie chains) count in each group"""
+        names = self._meta['protocols']
+        keys = []
+        for name in names:
+            value = (self._metadata.get(name) or {}).get(by)
+            keys.append(value if isinstance(value, list) else [value if value is not None else 'Unknown'])
+        groups = sorted({str(k) for ks in keys for k in ks})
+        position = {g: i for i, g in enumerate(groups)}
+        indicator = np.zeros((self._meta['capacity'], len(groups)), dtype=np.float64)
+        for col, ks in enumerate(keys):
+            for k in ks:
+                indicator[col, position[str(k)]] = 1
+        return groups, indicator
+
+    def aggregate(self, by='category', start=None, end=None, how='sum'):
+        """Aggregated TVL by a metadata field over a date window
+
+        Args:
+            by (str, optional): metadata field, "category" (default), "chain" or "chains"... Protocols on
+                many chains add their whole TVL to each of their chains when grouped by "chains"
+            start (str, optional): first date, ISO Format YYYY-MM-DD, default first stored date
+            end (str, optional): last date (included), default last stored date
+            how (str, optional): "sum" (default), "mean" (over protocols with a value) or "count"
+
+        Returns:
+            DataFrame: date x group
+        """
+        lo, hi = self._window(start, end)
+        groups, indicator = self._groups(by)
+        matrix = self._matrix()
+        out = np.empty((hi - lo, len(groups)))
+        counts = np.empty_like(out) if how != 'sum' else None
+        for i in range(lo, hi, self.chunk_rows):
+            block = np.asarray(matrix[i:min(i+self.chunk_rows, hi)], dtype=np.float64)
+            valid = ~np.isnan(block)
+            rows = slice(i - lo, i - lo + len(block))
+            out[rows] = np.where(valid, block, 0) @ indicator
+            if counts is not None:
+                counts[rows] = valid @ indicator
+        if how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out = out / counts
+        elif how == 'count':
+            out = counts
+        elif how != 'sum':
+            raise ValueError(f'how must be "sum", "mean" or "count", not {how!r}')
+        return pd.DataFrame(out, index=self.dates[lo:hi], columns=pd.Index(groups, name=by))
+
+    def top(self, k=10, date=None, start=None, end=None, by=None):
+        """Top protocols (or groups) by TVL
+
+        Args:
+            k (int, optional): number of results, default 10
+            date (str, optional): rank by TVL at this date, default last stored date
+            start (str, optional): if given, rank by mean TVL from start to end instead
+            end (str, optional): last date (included) of the mean window, default last stored date
+            by (str, optional): metadata field to rank groups instead of protocols, ie "category"
+
+        Returns:
+            Series: top k TVL values, descending. Empty if nothing is stored up to date
+        """
+        if start is None and self._window(None, date)[1] == 0:
+            return pd.Series([], index=pd.Index([], name=by or 'name'), name='totalLiquidityUSD', dtype=np.float64)
+
+        if by is not None:
+            if start is None:
+                day = self.dates[self._window(None, date)[1] - 1]
+                values = self.aggregate(by, day, day).iloc[-1]
+            else:
+                values = self.aggregate(by, start, end).mean()
+            return values.nlargest(k)
+
+        matrix = self._matrix()
+        n = len(self._meta['protocols'])
+        if start is None:
+            lo, hi = self._window(None, date)
+            values = np.asarray(matrix[hi - 1, :n], dtype=np.float64)
+        else:
+            lo, hi = self._window(start, end)
+            total, count = np.zeros(n), np.zeros(n)
+            for i in range(lo, hi, self.chunk_rows):
+                block = np.asarray(matrix[i:min(i+self.chunk_rows, hi), :n], dtype=np.float64)
+                total += np.nansum(block, axis=0)
+                count += (~np.isnan(block)).sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = total / count
+        values = np.where(np.isnan(values), -np.inf, values)
+        k = min(k, n)
+        best = np.argpartition(-values, k - 1)[:k] if k else np.array([], dtype=np.int64)
+        best = best[np.argsort(-values[best], kind='stable')]
+        best = best[np.isfinite(values[best])]
+        return pd.Series(values[best], index=pd.Index([self._meta['protocols'][c] for c in best], name='name'),
+                         name='totalLiquidityUSD')
@@ -0,0 +1,325 @@
+"""HTTP transports shared by all API fetchers
+
+Every fetcher in defi_tools goes through the transport returned by getTransport(),
+by default a pooled keep-alive HttpTransport. It can be replaced with setTransport(),
+ie by a ReplayTransport serving recorded JSON fixtures to work offline.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import span
+
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class HttpTransport:
+    """Keep-alive pooled HTTP transport with timeouts and retries
+
+    Args:
+        timeout (float or tuple, optional): seconds for (connect, read), default (5, 30)
+        retries (int, optional): max retries on 429/5xx and connection errors, default 3
+        backoff (float, optional): base seconds for exponential backoff with full jitter, default 0.5
+        max_backoff (float, optional): max seconds to wait between retries, default 30
+        pool_size (int, optional): max keep-alive connections per host, default 20
+        headers (dict, optional): extra headers sent in every request
+    """
+
+    def __init__(self, timeout=(5, 30), retries=3, backoff=0.5, max_backoff=30, pool_size=20, headers=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Accept': 'application/json'})
+        self.session.headers.update(headers or {})
+
+    def _sleep(self, attempt, response=None):
+        wait = None
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            wait = float(retry_after) if retry_after.isdigit() else None
+        if wait is None:
+            wait = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        time.sleep(min(wait, self.max_backoff))
+
+    def get(self, url, params=None):
+        """GET request with retries, returns the requests Response
+
+        Raises:
+            requests.HTTPError: if the status is still 429/5xx after all retries
+            requests.RequestException: if the connection still fails after all retries
+        """
+        with span('http', url=url) as s:
+            for attempt in range(self.retries + 1):
+                last = attempt == self.retries
+                s.set(retries=attempt)
+                try:
+                    r = self.session.get(url, params=params, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    if last:
+                        raise
+                    self._sleep(attempt)
+                    continue
+
+                s.set(status=r.status_code)
+                if r.status_code not in RETRY_STATUS:
+                    s.set(bytes=len(r.content))
+                    return r
+                if last:
+                    r.raise_for_status()
+                self._sleep(attempt, r)
+
+    def get_content(self, url, params=None):
+        """GET request returning the raw (decompressed) body as bytes"""
+        return self.get(url, params).content
+
+    def get_json(self, url, params=None):
+        """GET request returning the decoded JSON body"""
+        return self.get(url, params).json()
+
+    def close(self):
+        self.session.close()
+
+
+class RateLimiter:
+    """Thread safe token bucket rate limiter
+
+    Args:
+        rate (float): tokens added per second, ie 0.5 for 30 calls per minute
+        burst (int, optional): bucket capacity, max calls allowed at once, default 1
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available without blocking
+
+        Returns:
+            float: 0 if tokens were taken, else seconds to wait before trying again
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available and take them"""
+        wait = self.try_acquire(tokens)
+        while wait:
+            time.sleep(wait)
+            wait = self.try_acquire(tokens)
+
+    def available(self):
+        """tokens in the bucket now"""
+        with self._lock:
+            return min(self.burst, self._tokens + (time.monotonic() - self._updated) * self.rate)
+
+    def reset(self, tokens):
+        """Set the tokens in the bucket, ie to carry the limiter state over a restart"""
+        with self._lock:
+            self._tokens = max(0, min(self.burst, tokens))
+            self._updated = time.monotonic()
+
+
+def fixtureName(url, params=None):
+    """Fixture file name for a request, ie "api.llama.fi_protocol_uniswap.json"
+
+    Args:
+        url (string): request url
+        params (dict, optional): query params, a short hash of them is appended to the name
+
+    Returns:
+        string: file name
+    """
+    parts = urlsplit(url)
+    slug = re.sub(r'[^A-Za-z0-9.-]+', '_', f'{parts.netloc}{parts.path}').strip('_')
+    if params:
+        query = urlencode(sorted((str(k), str(v)) for k, v in dict(params).items()))
+        slug += '__' + hashlib.sha1(query.encode()).hexdigest()[:10]
+    return f'{slug}.json'
+
+
+class ReplayTransport:
+    """Offline transport serving recorded JSON fixtures from a directory
+
+    Args:
+        path (string): fixtures directory, one file per request named by fixtureName()
+        fallback (transport, optional): if given, missing fixtures are fetched with it
+            and recorded into path, else a FileNotFoundError is raised
+    """
+
+    def __init__(self, path, fallback=None):
+        self.path = path
+        self.fallback = fallback
+
+    def get_content(self, url, params=None):
+        file = os.path.join(self.path, fixtureName(url, params))
+        if not os.path.exists(file):
+            if self.fallback is None:
+                raise FileNotFoundError(f'No fixture for {url} {params or ""}: {file}')
+            content = self.fallback.get_content(url, params)
+            os.makedirs(self.path, exist_ok=True)
+            with open(file, 'wb') as f:
+                f.write(content)
+            return content
+
+        with open(file, 'rb') as f:
+            return f.read()
+
+    def get_json(self, url, params=None):
+        return json.loads(self.get_content(url, params))
+
+
+class _Flight:
+    """result of an in-flight request, shared by every caller waiting for it"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.content = self.error = None
+
+    def set(self, content=None, error=None):
+        self.content, self.error = content, error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.content
+
+
+class CoalescingTransport:
+    """Transport wrapper sharing identical requests between threads
+
+    Concurrent calls for the same url & params share one in-flight request (single-flight),
+    and responses are memoized for ttl seconds in a LRU of max_entries. Errors are shared
+    with the callers waiting for the failed request, but never memoized.
+
+    Args:
+        transport (optional): wrapped transport with get_content(url, params), default a new HttpTransport
+        ttl (float, optional): seconds a response is reused, default 5. 0 only coalesces in-flight requests
+        max_entries (int, optional): max memoized responses, least recently used are evicted, default 256
+    """
+
+    def __init__(self, transport=None, ttl=5, max_entries=256):
+        self.transport = HttpTransport() if transport is None else transport
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = self.misses = self.shared = self.evictions = 0
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(url, params):
+        return url, tuple(sorted((str(k), str(v)) for k, v in dict(params or {}).items()))
+
+    def get_content(self, url, params=None):
+        """GET request returning the raw body, from the memo or a shared in-flight request if possible"""
+        key = self._key(url, params)
+        with span('coalesce', url=url) as s:
+            with self._lock:
+                entry = self._cache.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    s.set(cache='hit')
+                    return entry[1]
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+                    self.misses += 1
+                else:
+                    self.shared += 1
+
+            if not leader:
+                s.set(cache='shared')
+                return flight.wait()
+
+            s.set(cache='miss')
+            try:
+                content = self.transport.get_content(url, params)
+            except Exception as e:
+                with self._lock:
+                    del self._inflight[key]
+                flight.set(error=e)
+                raise
+
+            with self._lock:
+                del self._inflight[key]
+                if self.ttl > 0:
+                    self._cache[key] = (time.monotonic() + self.ttl, content)
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+                        self.evictions += 1
+            flight.set(content)
+            return content
+
+    def get_json(self, url, params=None):
+        """GET request returning the decoded JSON body, decoded for each caller so it can be modified"""
+        return json.loads(self.get_content(url, params))
+
+    def stats(self):
+        """Hit, miss, shared (coalesced in-flight) & eviction counters, memoized entries and hit ratio"""
+        with self._lock:
+            calls = self.hits + self.misses + self.shared
+            return {'hits': self.hits, 'misses': self.misses, 'shared': self.shared,
+                    'evictions': self.evictions, 'entries': len(self._cache),
+                    'hit_ratio': (self.hits + self.shared) / calls if calls else 0.0}
+
+    def clear(self):
+        """Drop memoized responses, counters are kept"""
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        if hasattr(self.transport, 'close'):
+            self.transport.close()
+
+
+_transport = None
+
+
+def getTransport():
+    """Transport used by all fetchers, a default HttpTransport is created on first use"""
+    global _transport
+    if _transport is None:
+        _transport = HttpTransport()
+    return _transport
+
+
+def setTransport(transport):
+    """Replace the transport used by all fetchers
+
+    Args:
+        transport: object with get_json(url, params) and get_content(url, params) methods,
+            ie HttpTransport(timeout=10) or ReplayTransport('fixtures/'). None restores the default
+    """
+    global _transport
+    _transport = transport
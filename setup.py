@@ -17,4 +17,5 @@ setup(name="defi",
 	keywords="defi, impermanent loss, finance, cryptos, bitcoin, liquidity pool, farming, bsc, eth, terra, heco, blockchain " ,
 	classifiers=["Programming Language :: Python :: 3","License :: OSI Approved :: MIT License","Operating System :: OS Independent"],
 	python_requires=">=3.6",
-	install_requires=["pandas","matplotlib", "datetime","requests","scipy","numpy"])
+	install_requires=["pandas","matplotlib", "datetime","requests","numpy"],
+	extras_require={"async": ["aiohttp"]})
@@ -0,0 +1,16 @@
+import numpy as np
+
+from defi.backtest import entryArrays
+
+
+def test_window_counts_rows_with_both_prices():
+    a = np.array([1, 2, np.nan, 4, 5, 6.])[:, np.newaxis]
+    b = np.array([1, 1, 1, np.nan, 1, 1.])[:, np.newaxis]
+    res = entryArrays(a, b, [36.5], window=3)
+
+    # rows 2 & 3 are gaps, so the start at row 0 holds rows 0, 1 & 4
+    assert res['valid'][:, 0].tolist() == [True, True, False, False, False, False]
+    assert res['end'][:2, 0].tolist() == [4, 5]
+    assert res['days'][:2, 0].tolist() == [3, 3]
+    assert res['token_a'][:2, 0].tolist() == [5, 3]
+    assert np.allclose(res['rewards'][:2, 0, 0], 0.003)
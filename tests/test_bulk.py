@@ -0,0 +1,136 @@
+import json
+import os
+
+import pytest
+import requests
+
+from defi.bulk import BulkDownload
+from defi.transport import RateLimiter, ReplayTransport, fixtureName
+
+
+COINS = ['coin-a', 'coin-b', 'coin-c', 'coin-d']
+
+
+def history(days, price=1.0):
+    dates = [1_600_000_000_000 + 86_400_000 * i for i in range(days)]
+    return {key: [[d, price * mult * (1 + i / 100)] for i, d in enumerate(dates)]
+            for key, mult in (('prices', 1), ('market_caps', 1e9), ('total_volumes', 1e7))}
+
+
+class FlakyTransport:
+    """ReplayTransport of coin histories failing the first requests of some coins"""
+
+    def __init__(self, path, failures=None, status=429):
+        self.replay = ReplayTransport(path)
+        self.failures = dict(failures or {})
+        self.status = status
+        self.calls = []
+
+    def get_json(self, url, params=None):
+        coin = url.split('/coins/')[1].split('/')[0]
+        self.calls.append(coin)
+        if self.failures.get(coin, 0) > 0:
+            self.failures[coin] -= 1
+            response = requests.Response()
+            response.status_code = self.status
+            response.headers['Retry-After'] = '0'
+            raise requests.HTTPError(f'{self.status} error', response=response)
+        return self.replay.get_json(url, params)
+
+
+@pytest.fixture
+def fixtures(tmp_path):
+    path = tmp_path / 'fixtures'
+    path.mkdir()
+    for i, coin in enumerate(COINS):
+        url = f'https://api.coingecko.com/api/v3/coins/{coin}/market_chart'
+        with open(path / fixtureName(url, {'vs_currency': 'usd', 'days': 'max'}), 'w') as f:
+            json.dump(history(30 + i), f)
+    return str(path)
+
+
+def job(tmp_path, transport, ids=COINS, **kwargs):
+    kwargs.setdefault('rate_limit', RateLimiter(rate=1000, burst=10))
+    return BulkDownload(ids, str(tmp_path / 'bulk'), backoff=0.001, max_backoff=0.01, transport=transport, **kwargs)
+
+
+def test_downloads_all_in_priority_order(tmp_path, fixtures):
+    transport = FlakyTransport(fixtures)
+    status = job(tmp_path, transport, max_workers=1, priorities={'coin-d': -1}).run()
+
+    assert transport.calls == ['coin-d', 'coin-a', 'coin-b', 'coin-c']
+    assert (status.status == 'done').all()
+    assert status.rows.tolist() == [30, 31, 32, 33]
+    assert len(job(tmp_path, transport).load('coin-c')) == 32
+
+
+def test_retries_own_every_request(tmp_path, fixtures):
+    transport = FlakyTransport(fixtures, failures={'coin-b': 2})
+    records = []
+    status = job(tmp_path, transport, retries=3).run(progress=records.append)
+
+    assert status.loc['coin-b', 'status'] == 'done'
+    assert status.loc['coin-b', 'attempts'] == 3
+    # one request per attempt, no hidden transport retries
+    assert transport.calls.count('coin-b') == 3
+    assert [r['status'] for r in records if r['id'] == 'coin-b'] == ['retry', 'retry', 'done']
+
+
+def test_failures_after_retries_and_not_retryable(tmp_path, fixtures):
+    transport = FlakyTransport(fixtures, failures={'coin-a': 5})
+    status = job(tmp_path, transport, ids=COINS + ['missing'], retries=2).run()
+
+    assert status.loc['coin-a', 'status'] == 'failed'
+    assert status.loc['coin-a', 'attempts'] == 3
+    assert status.loc['missing', 'status'] == 'failed'
+    assert status.loc['missing', 'attempts'] == 1
+    assert status.loc['missing', 'error'].startswith('FileNotFoundError')
+
+
+def test_resume_after_partial_manifest(tmp_path, fixtures):
+    transport = FlakyTransport(fixtures)
+    job(tmp_path, transport, ids=COINS[:2]).run()
+
+    # crash while coin-c was running, with the last line cut while writing
+    manifest = tmp_path / 'bulk' / 'manifest.jsonl'
+    with open(manifest, 'a') as f:
+        f.write(json.dumps({'id': 'coin-c', 'status': 'running', 'attempts': 0,
+                            'updated': os.path.getmtime(manifest), 'tokens': 0}) + '\n')
+        f.write('{"id": "coin-d", "sta')
+
+    transport.calls.clear()
+    resumed = job(tmp_path, transport)
+    assert resumed.status().status.tolist() == ['done', 'done', 'running', 'pending']
+    status = resumed.run()
+
+    assert sorted(transport.calls) == ['coin-c', 'coin-d']
+    assert (status.status == 'done').all()
+    assert status.attempts.tolist() == [1, 1, 1, 1]
+
+
+def test_retry_failed(tmp_path, fixtures):
+    transport = FlakyTransport(fixtures, failures={'coin-b': 1}, status=404)
+    assert job(tmp_path, transport).run().loc['coin-b', 'status'] == 'failed'
+
+    transport.calls.clear()
+    assert job(tmp_path, transport).run().loc['coin-b', 'status'] == 'failed'
+    assert transport.calls == []
+
+    status = job(tmp_path, transport, retry_failed=True).run()
+    assert transport.calls == ['coin-b']
+    assert status.loc['coin-b', 'status'] == 'done'
+    assert status.loc['coin-b', 'attempts'] == 2
+
+
+def test_rate_limiter_state_survives_restart(tmp_path, fixtures):
+    limiter = RateLimiter(rate=0.001, burst=4)
+    job(tmp_path, FlakyTransport(fixtures), rate_limit=limiter).run()
+    assert limiter.available() < 1
+
+    restarted = RateLimiter(rate=0.001, burst=4)
+    job(tmp_path, FlakyTransport(fixtures), rate_limit=restarted)
+    assert restarted.available() < 1
+
+
+def test_default_transport_does_not_retry(tmp_path):
+    assert BulkDownload([], str(tmp_path / 'bulk')).transport.retries == 0
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from defi.cache import HISTORY_COLUMNS, HistoryCache
+
+
+def history(days):
+    index = pd.date_range('2021-01-01', periods=days, name='date', unit='ns')
+    return pd.DataFrame(np.arange(days * 3, dtype=float).reshape(days, 3), index=index, columns=HISTORY_COLUMNS)
+
+
+def test_save_load_round_trip(tmp_path):
+    cache = HistoryCache(str(tmp_path))
+    cache.save('bitcoin', 'usd', history(5))
+    df, fetched_at = cache.load('bitcoin')
+    pd.testing.assert_frame_equal(df, history(5), check_freq=False)
+    assert cache.is_fresh(fetched_at)
+
+    cache.save('empty', 'usd', history(0))
+    assert cache.load('empty')[0].shape == (0, 3)
+
+
+def test_interrupted_save_is_a_miss(tmp_path):
+    cache = HistoryCache(str(tmp_path))
+    cache.save('bitcoin', 'usd', history(5))
+    path = os.path.join(cache._dir('bitcoin', 'usd'), 'history.npy')
+    with open(path, 'rb') as f:
+        content = f.read()
+    with open(path, 'wb') as f:
+        f.write(content[:-10])
+    assert cache.load('bitcoin') == (None, None)
+
+    np.save(path, np.zeros((5, 3)))  # unknown layout
+    assert cache.load('bitcoin') == (None, None)
+
+
+def test_hits_only_write_access_times_for_eviction(tmp_path):
+    cache = HistoryCache(str(tmp_path))
+    cache.save('bitcoin', 'usd', history(5))
+    meta = os.path.join(cache._dir('bitcoin', 'usd'), 'meta.json')
+    mtime = os.stat(meta).st_mtime_ns
+    cache.load('bitcoin')
+    assert os.stat(meta).st_mtime_ns == mtime
+
+    lru = HistoryCache(str(tmp_path / 'lru'), max_entries=1)
+    lru.save('a', 'usd', history(2))
+    lru.save('b', 'usd', history(2))
+    assert [m['ticker'] for m in lru.entries()] == ['b']
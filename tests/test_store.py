@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from defi.store import TvlStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """store with 10 days from 2021-01-01: "a" rising 0..9, "b" falling 9..0, "c" only the last 5 days"""
+    store = TvlStore(str(tmp_path), start='2021-01-01', dtype='float64', chunk_rows=3)
+    dates = pd.date_range('2021-01-01', periods=10)
+    store.ingest('a', pd.Series(np.arange(10.), index=dates))
+    store.ingest('b', pd.Series(np.arange(10.)[::-1], index=dates))
+    store.ingest('c', pd.Series([100.] * 5, index=dates[5:]))
+    store.updateMetadata(pd.DataFrame({'category': ['Dexes', 'Dexes', 'Lending'], 'chain': ['BSC'] * 3},
+                                      index=['a', 'b', 'c']))
+    return store
+
+
+def test_frame_window_edges(store):
+    assert store.frame(start='2020-01-01', end='2030-01-01').shape == (10, 3)
+    assert store.frame(end='2020-12-31').empty
+    assert store.frame(start='2021-01-11').empty
+
+    first = store.frame(start='2021-01-01', end='2021-01-01')
+    assert first.index.tolist() == [pd.Timestamp('2021-01-01')]
+    assert first.iloc[0].tolist()[:2] == [0, 9] and np.isnan(first.iloc[0, 2])
+
+    last = store.frame(start='2021-01-10', end='2021-01-10')
+    assert last.iloc[0].tolist() == [9, 0, 100]
+
+
+def test_top_at_edges(store):
+    assert store.top(2).to_dict() == {'c': 100, 'a': 9}
+    assert store.top(5, date='2021-01-01').to_dict() == {'b': 9, 'a': 0}
+    # after the last stored day, ranks the last one
+    assert store.top(1, date='2030-01-01').to_dict() == {'c': 100}
+
+
+def test_top_before_first_day_is_empty(store):
+    assert store.top(3, date='2020-12-31').empty
+    assert store.top(3, date='2020-12-31', by='category').empty
+    assert TvlStore(str(store.path) + '_empty').top(3).empty
+
+
+def test_top_mean_window_and_groups(store):
+    assert store.top(3, start='2021-01-01', end='2021-01-02').to_dict() == {'b': 8.5, 'a': 0.5}
+    assert store.top(2, by='category').to_dict() == {'Lending': 100, 'Dexes': 9}
+    assert store.top(2, date='2021-01-01', by='category').to_dict() == {'Dexes': 9, 'Lending': 0}  # groups without values sum 0
+
+
+def test_aggregate_matches_pandas(store):
+    frame = store.frame()
+    expected = frame.T.groupby(store.metadata['category']).sum().T
+    pd.testing.assert_frame_equal(store.aggregate('category'), expected, check_names=False, check_dtype=False)
+
+
+def test_ingest_is_incremental_and_reopens(store):
+    dates = pd.date_range('2021-01-01', periods=12)
+    assert store.ingest('a', pd.Series(np.arange(12.), index=dates)) == 3  # last stored day & 2 new ones
+    reopened = TvlStore(store.path)
+    assert len(reopened.dates) == 12
+    assert reopened.protocols == ['a', 'b', 'c']
+    assert reopened.top(1).to_dict() == {'a': 11}
+
+
+def test_capacity_growth_survives_a_crash_before_save(tmp_path):
+    path = str(tmp_path / 'tvl')
+    dates = pd.date_range('2021-01-01', periods=5)
+    store = TvlStore(path, start='2021-01-01', dtype='float64')
+    store.ingest('saved', pd.Series(np.arange(100., 105.), index=dates))
+    # more protocols than the first 64 columns, never saved: stops before update() writes meta.json
+    for i in range(69):
+        store.ingest(f'p{i}', pd.Series(np.arange(5.) + i, index=dates), save=False)
+    del store
+
+    reopened = TvlStore(path)
+    assert reopened.frame(['saved'])['saved'].tolist() == [100, 101, 102, 103, 104]
+    assert reopened.frame(['p10'])['p10'].tolist() == [10, 11, 12, 13, 14]
+    assert sorted(os.listdir(path)) == ['meta.json', 'tvl.128.dat']
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from defi.transport import CoalescingTransport
+
+
+class SlowUpstream:
+    """upstream transport holding every request until released, failing while fail is set"""
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def get_content(self, url, params=None):
+        with self._lock:
+            self.calls += 1
+        self.release.wait(5)
+        if self.fail:
+            raise ConnectionError('upstream down')
+        return json.dumps({'url': url, 'params': params}).encode()
+
+
+def burst(transport, n, url='https://api.llama.fi/protocols'):
+    """n concurrent get_json() calls, released once all but the leader joined the in-flight request"""
+    def call(_):
+        try:
+            return transport.get_json(url)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        futures = [pool.submit(call, i) for i in range(n)]
+        deadline = time.monotonic() + 5
+        while transport.shared < n - 1 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        transport.transport.release.set()
+        return [f.result() for f in futures]
+
+
+def test_concurrent_burst_makes_one_upstream_call():
+    transport = CoalescingTransport(SlowUpstream(), ttl=60)
+    results = burst(transport, 20)
+
+    assert transport.transport.calls == 1
+    assert all(r == {'url': 'https://api.llama.fi/protocols', 'params': None} for r in results)
+    # decoded for each caller
+    assert len({id(r) for r in results}) == 20
+    assert transport.stats()['misses'] == 1 and transport.stats()['shared'] == 19
+
+    transport.get_json('https://api.llama.fi/protocols')
+    assert transport.transport.calls == 1
+    assert transport.hits == 1
+
+
+def test_errors_are_shared_but_not_cached():
+    transport = CoalescingTransport(SlowUpstream(fail=True), ttl=60)
+    results = burst(transport, 10)
+
+    assert transport.transport.calls == 1
+    assert all(isinstance(r, ConnectionError) for r in results)
+
+    transport.transport.fail = False
+    assert transport.get_json('https://api.llama.fi/protocols')['url'] == 'https://api.llama.fi/protocols'
+    assert transport.transport.calls == 2
+    assert transport.stats()['entries'] == 1
+
+
+def test_params_are_separate_requests():
+    upstream = SlowUpstream()
+    upstream.release.set()
+    transport = CoalescingTransport(upstream, ttl=60)
+    transport.get_json('https://api.coingecko.com/api/v3/coins/list', {'page': 1})
+    transport.get_json('https://api.coingecko.com/api/v3/coins/list', {'page': 2})
+    transport.get_json('https://api.coingecko.com/api/v3/coins/list', {'page': 1})
+    assert upstream.calls == 2
+
+
+def test_ttl_and_lru_eviction():
+    upstream = SlowUpstream()
+    upstream.release.set()
+    transport = CoalescingTransport(upstream, ttl=0.05, max_entries=2)
+    for page in (1, 2, 3):
+        transport.get_json('https://x', {'page': page})
+    assert transport.evictions == 1
+    transport.get_json('https://x', {'page': 1})
+    assert upstream.calls == 4
+
+    time.sleep(0.06)
+    transport.get_json('https://x', {'page': 3})
+    assert upstream.calls == 5
+
+
+def test_ttl_zero_only_coalesces():
+    upstream = SlowUpstream()
+    upstream.release.set()
+    transport = CoalescingTransport(upstream, ttl=0)
+    transport.get_json('https://x')
+    transport.get_json('https://x')
+    assert upstream.calls == 2
+    assert transport.stats()['entries'] == 0